@@ -20,10 +20,25 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import wx
+import wx.lib.dialogs
 from wx import xrc
 from grid import Grid
+from tools import path_cells, flood_fill, color_mask, rectangle_mask, remove_confetti
+from pattern import Pattern
 from image_importer import ImageImporter
-from math import sqrt
+from color_matcher import MatcherCache, METRICS, code2rgb
+from palette_reducer import PaletteReducer
+from canvas_cache import CanvasCache
+from command_log import Command, CommandLog, Stroke
+from palette import load_palette
+from color_list import ColorListBox
+from import_worker import ImportWorker
+from dither import DITHER_MODES
+from pattern_file import save_pattern, load_pattern
+from chart import export_chart
+from floss import usage_report
+from profiler import profiler, timed
+import numpy
 
 class MyApp(wx.App):
 
@@ -32,15 +47,43 @@ class MyApp(wx.App):
         self._xrcfn = xrcfn
         self._colorsfn = colorsfn
         self._scroll_rate = 10
-        self._erase_tool = False
-        self._grid = Grid()
 
-        self._operations = []
-        self._current_operation = None
+        # Current tool, the name of its toolbar item
+        self._tool = 'editgrid'
+        self._tools = ('editgrid', 'erase', 'fill', 'replace', 'rectangle')
+        self._rectangle_start = None
+
+        # Regions with fewer stitches are removed by the confetti cleanup
+        self._confetti_size = 3
+
+        self._pattern = Pattern ()
+        self._grid = Grid (self._pattern)
+
         self._max_undo = 100
+        self._commands = CommandLog (self._max_undo)
+        self._stroke = None
+
+        # Nearest color lookup tables, one per recently used palette
+        self._matchers = MatcherCache (4)
+
+        # Pixels of the image being imported, for the automatic palette
+        self._import_pixels = None
+
+        # Image import running in the background, if any
+        self._import = None
+        self._import_progress = None
 
         self._timer = None
         self._current_mouse_pos = (-1, -1)
+
+        # Cell under the mouse, so the status bar and the tooltip timer are
+        # only updated when it changes
+        self._hover_cell = None
+
+        # Cells the mouse went through while dragging, applied on the next
+        # idle event, and the last one applied in the current stroke
+        self._drag_cells = []
+        self._drag_last = None
         
         wx.App.__init__ (self)
 
@@ -57,23 +100,19 @@ class MyApp(wx.App):
         self._palette_dialog = self._res.LoadDialog(self._frame, "SelectColorPaletteDialog")
 
         self._avlb_id = 1234
-        self._available_listbox = wx.SimpleHtmlListBox(
-                                  self._palette_dialog,
-                                  self._avlb_id,
-                                  style=wx.HLB_MULTIPLE,
-                                  size=(230,460)) 
+        self._available_listbox = ColorListBox (self._palette_dialog,
+                                                self._avlb_id,
+                                                self._dmcs,
+                                                self._colors,
+                                                size=(230,460))
+        self._available_listbox.set_items (range (len(self._dmcs)))
 
         self._selb_id = 1235
-        self._select_listbox = wx.SimpleHtmlListBox(
-                                  self._palette_dialog,
-                                  self._selb_id,
-                                  style=wx.HLB_MULTIPLE,
-                                  size=(230,460))
-        
-        for dmc in self._colors.keys():
-            code, name = self._colors[dmc]
-            self._available_listbox.Append('<table><tr><td bgcolor="%s" colspan="15" nowrap> </td><td>%s #%s</td></tr></table>' % (code[0:7], name, dmc))
-            
+        self._select_listbox = ColorListBox (self._palette_dialog,
+                                             self._selb_id,
+                                             self._dmcs,
+                                             self._colors,
+                                             size=(230,460))
 
         self._res.AttachUnknownControl(
                              'AvailableColorListUnknown',
@@ -89,15 +128,21 @@ class MyApp(wx.App):
         self._palette_dialog.Bind(wx.EVT_BUTTON, self._add_colors_to_palette, id = xrc.XRCID ('AddColorBtn'))
         self._palette_dialog.Bind(wx.EVT_BUTTON, self._remove_colors_from_palette, id = xrc.XRCID ('RemoveColorBtn'))
         self._palette_dialog.Bind(wx.EVT_BUTTON, self._set_current_palette, id = xrc.XRCID ('PaletteAcceptBtn'))
+        self._palette_dialog.Bind(wx.EVT_BUTTON, self._auto_select_colors, id = xrc.XRCID ('AutoPaletteBtn'))
             
         return True
 
     def _set_current_palette (self, event):
 
-        dmcs = [x.split("#")[2].split("<")[0] for x in self._select_listbox.GetStrings()]
-        self._current_palette = {}
-        for d in dmcs:
-            self._current_palette[d] = self._colors[d]
+        dmcs = [self._select_listbox.get_dmc (i) for i in self._select_listbox.get_items()]
+
+        # Without a selection, all the colors are used
+        if dmcs:
+            self._current_palette = {}
+            for d in dmcs:
+                self._current_palette[d] = self._colors[d]
+        else:
+            self._current_palette = self._colors
 
         event.Skip()
 
@@ -105,107 +150,81 @@ class MyApp(wx.App):
         
     def _add_colors_to_palette (self, event):
 
-        remove = []
-        item, cookie = self._available_listbox.GetFirstSelected()
-
-        while wx.NOT_FOUND != item:
-            s = self._available_listbox.GetString(item)
-            self._select_listbox.Append(s)
-            remove.append(item)
-            item, cookie = self._available_listbox.GetNextSelected(cookie)
-
-
-        for r in remove:
-            self._available_listbox.Delete(r)
-
-        self._available_listbox.DeselectAll()
-        self._select_listbox.DeselectAll()
+        self._move_colors (self._available_listbox, self._select_listbox)
 
         event.Skip()
             
     def _remove_colors_from_palette (self, event):
 
-        remove = []
-        item, cookie = self._select_listbox.GetFirstSelected()
-        
-        while wx.NOT_FOUND != item:
-            s = self._select_listbox.GetString(item)
-            self._available_listbox.Append(s)
-            remove.append(item)
-            item, cookie = self._select_listbox.GetNextSelected(cookie)
-
-        for r in remove:
-            self._select_listbox.Delete(r)        
-
-        self._select_listbox.DeselectAll()
-        self._available_listbox.DeselectAll()
+        self._move_colors (self._select_listbox, self._available_listbox)
 
         event.Skip()
-        
-    def _import_colors (self):
 
-        f = open(self._colorsfn, 'r')
-        ls = f.readlines()
-        f.close()
+    def _auto_select_colors (self, event):
 
-        self._colors = {}
-        for l in ls:
-            dmc, name, code = l.split(',')
-            self._colors[dmc] = (code, name)            
+        n = wx.GetNumberFromUser ('Number of thread colors to choose for the image',
+                                  'Colors:', 'Automatic palette', 16, 1, len(self._dmcs),
+                                  self._palette_dialog)
 
-        self._current_palette = self._colors
-        
-    def _find_dmc_color (self, color):
-        for dmc in self._colors.keys():
-            code, name = self._colors[dmc]
+        if n > 0 and self._import_pixels is not None:
+            wx.BeginBusyCursor ()
+            try:
+                dmcs = self._reducer.reduce (self._import_pixels, n)
+            finally:
+                wx.EndBusyCursor ()
 
-            red = int(code[1:3], 16)
-            green = int(code[3:5], 16)
-            blue = int(code[5:7], 16)
+            selected = set ([self._dmc_indices[dmc] for dmc in dmcs])
+            self._select_listbox.set_items (selected)
+            self._available_listbox.set_items (set (range (len(self._dmcs))) - selected)
 
-            if red == color.Red() and green == color.Green() and blue == color.Blue():
-                return '%s #%s' % (name, dmc)
+        event.Skip()
 
-        return 'None'
+    def _move_colors (self, source, target):
 
-    def _find_closest_dmc_color (self, color):
+        moved = source.get_selected_items ()
 
-        distance = 1000
+        source.set_items (set(source.get_items ()) - set(moved))
+        target.set_items (target.get_items () + moved)
         
-        red = color.Red()
-        green = color.Green()
-        blue = color.Blue()
+    def _import_colors (self):
 
-        bestred, bestgreen, bestblue = (None, None, None)
-        
-        for dmc in self._current_palette.keys():
-            code, name = self._current_palette[dmc]
+        self._dmcs, self._colors = load_palette (self._colorsfn)
+
+        # Reverse indices, from RGB values to the DMC code and the name
+        # shown for the color
+        self._dmc_codes = {}
+        self._color_names = {}
+        for dmc in self._colors.keys():
+            code, name = self._colors[dmc]
+            self._dmc_codes.setdefault (code2rgb (code), dmc)
+            self._color_names.setdefault (code2rgb (code), '%s #%s' % (name, dmc))
 
-            dred = int(code[1:3], 16)
-            dgreen = int(code[3:5], 16)
-            dblue = int(code[5:7], 16)
+        self._dmc_indices = dict ([(dmc, i) for i, dmc in enumerate (self._dmcs)])
+        self._reducer = PaletteReducer (self._colors)
 
-            r = (dred + red) / 2
-            dr = dred - red
-            dg = dgreen - green
-            db = dblue - blue
+        self._current_palette = self._colors
+        
+    def _find_dmc_color (self, color):
 
-            ndistance = (2+r/256)*dr**2 + 4*dg**2 + (2+(255-r)/256)*db**2
-            ndistance = sqrt(ndistance)
-            
-            if ndistance < distance:
-                distance = ndistance
-                bestred, bestgreen, bestblue = (dred, dgreen, dblue)
+        return self._color_names.get (color.Get(), 'None')
 
-        return wx.Colour (bestred, bestgreen, bestblue)
-            
-            
+    @timed ('paint')
     def OnPaint (self, event):
 
         dc = wx.PaintDC (event.GetEventObject())
         dc.Clear()
         self._panel.DoPrepareDC(dc)
-        self._grid.draw_grid (dc)
+
+        # Only copy the damaged parts of the visible area from the cache
+        rects = []
+        region = wx.RegionIterator (self._panel.GetUpdateRegion())
+        while region:
+            rect = region.GetRect()
+            rect.SetPosition (self._panel.CalcUnscrolledPosition (rect.GetPosition()))
+            rects.append (rect)
+            region.Next()
+
+        self._canvas.draw (dc, rects)
 
         event.Skip()
 
@@ -214,14 +233,15 @@ class MyApp(wx.App):
         self._panel = xrc.XRCCTRL (self._frame, 'MainPanel')
         self._panel.SetScrollRate (self._scroll_rate, self._scroll_rate)
         self._panel.SetVirtualSize (self._grid.get_size ())
+        self._canvas = CanvasCache (self._grid, self._panel.GetBackgroundColour ())
 
         self._toolbar = self._frame.GetToolBar () 
-        self._toolbar.ToggleTool (xrc.XRCID('editgrid'), not self._erase_tool)
-        self._toolbar.ToggleTool (xrc.XRCID('erase'), self._erase_tool)
+        for tool in self._tools:
+            self._toolbar.ToggleTool (xrc.XRCID(tool), tool == self._tool)
         
         color_choice_id = 54 # Random int
         color_list = []
-        for k in self._colors.keys():
+        for k in self._dmcs:
             dmc = k
             code, name = self._colors[k]
             
@@ -233,18 +253,27 @@ class MyApp(wx.App):
         
         self._menubar = self._frame.GetMenuBar()
         self._statusbar = self._frame.GetStatusBar()
+        if profiler.is_enabled ():
+            self._add_profile_menu ()
         
         self._panel.Bind(wx.EVT_PAINT, self.OnPaint)
         self._panel.Bind(wx.EVT_MOUSE_EVENTS, self._print_cell)
+        self._frame.Bind(wx.EVT_IDLE, self._apply_drag)
         self._toolbar.Bind(wx.EVT_TOOL, self._undo,     id = xrc.XRCID('undo'))
         self._toolbar.Bind(wx.EVT_TOOL, self._redo,     id = xrc.XRCID('redo'))
         self._toolbar.Bind(wx.EVT_TOOL, self._set_zoom, id = xrc.XRCID('zoomout'))
         self._toolbar.Bind(wx.EVT_TOOL, self._set_zoom, id = xrc.XRCID('zoomin'))
-        self._toolbar.Bind(wx.EVT_TOOL, self._set_edit, id = xrc.XRCID('editgrid'))
-        self._toolbar.Bind(wx.EVT_TOOL, self._set_edit, id = xrc.XRCID('erase'))
+        for tool in self._tools:
+            self._toolbar.Bind(wx.EVT_TOOL, self._set_edit, id = xrc.XRCID(tool))
         self._toolbar.Bind,wx.EVT_CHOICE(self, color_choice_id, self._change_color)
 
+        self._frame.Bind(wx.EVT_MENU, self._new_pattern, id = xrc.XRCID('newpattern'))
+        self._frame.Bind(wx.EVT_MENU, self._open_pattern, id = xrc.XRCID('openpattern'))
+        self._frame.Bind(wx.EVT_MENU, self._save_pattern, id = xrc.XRCID('savepattern'))
         self._frame.Bind(wx.EVT_MENU, self._import_image, id = xrc.XRCID('importimage'))
+        self._frame.Bind(wx.EVT_MENU, self._export_chart, id = xrc.XRCID('exportchart'))
+        self._frame.Bind(wx.EVT_MENU, self._remove_confetti, id = xrc.XRCID('removeconfetti'))
+        self._frame.Bind(wx.EVT_MENU, self._show_thread_usage, id = xrc.XRCID('threadusage'))
 
         self._timer = wx.Timer()
         self._timer.Bind(wx.EVT_TIMER, self._show_tooltip)
@@ -260,34 +289,278 @@ class MyApp(wx.App):
         self._frame.Show()
 
 
+    def _add_profile_menu (self):
+
+        # Only there when profiling, so it is built here rather than in the
+        # XRC resources
+        menu = wx.Menu ()
+        stats_item = menu.Append (wx.ID_ANY, 'Show statistics')
+        next_item = menu.Append (wx.ID_ANY, 'Profile next operation')
+        reset_item = menu.Append (wx.ID_ANY, 'Reset statistics')
+        self._menubar.Append (menu, 'Profile')
+
+        self._frame.Bind(wx.EVT_MENU, self._show_profile_stats, stats_item)
+        self._frame.Bind(wx.EVT_MENU, self._profile_next, next_item)
+        self._frame.Bind(wx.EVT_MENU, self._reset_profile_stats, reset_item)
+
+    def _show_profile_stats (self, event):
+
+        text = profiler.format_stats ()
+        if profiler.get_profile ():
+            text += '\n\n' + profiler.get_profile ()
+
+        dialog = wx.lib.dialogs.ScrolledMessageDialog (self._frame, text, 'Profile statistics', size=(700, 500))
+        dialog.ShowModal ()
+        dialog.Destroy ()
+
+        event.Skip()
+
+    def _profile_next (self, event):
+
+        profiler.profile_next ()
+        self._statusbar.SetStatusText ('The next operation will be profiled')
+
+        event.Skip()
+
+    def _reset_profile_stats (self, event):
+
+        profiler.reset ()
+
+        event.Skip()
+
+    def _new_pattern (self, event):
+
+        xcells, ycells = self._pattern.get_dimensions ()
+
+        xcells = wx.GetNumberFromUser ('Width of the new pattern, in stitches', 'Width',
+                                       'New pattern', xcells, 1, 5000, self._frame)
+        if xcells < 0:
+            return
+
+        ycells = wx.GetNumberFromUser ('Height of the new pattern, in stitches', 'Height',
+                                       'New pattern', ycells, 1, 5000, self._frame)
+        if ycells < 0:
+            return
+
+        self._set_pattern (Pattern (xcells, ycells))
+
+        event.Skip()
+
+    def _set_pattern (self, pattern):
+
+        self._cancel_import ()
+        self._finish_stroke ()
+        self._commands.clear ()
+
+        self._pattern = pattern
+        self._grid = Grid (pattern)
+        self._canvas = CanvasCache (self._grid, self._panel.GetBackgroundColour ())
+
+        self._panel.SetVirtualSize (self._grid.get_size ())
+        self._panel.FitInside ()
+        self._panel.Refresh ()
+
+    def _open_pattern (self, event):
+
+        path = wx.FileSelector ('Open a pattern',
+                               wildcard = "Stitchy pattern|*.stitchy|Other|*",
+                               flags = wx.FD_OPEN | wx.FD_FILE_MUST_EXIST,
+                               parent = self._frame)
+
+        if path:
+            try:
+                plane, colors, history = load_pattern (path)
+            except (IOError, ValueError) as e:
+                wx.MessageBox (str(e), 'Cannot open the pattern', wx.OK | wx.ICON_ERROR, self._frame)
+                return
+
+            xcells, ycells = plane.shape
+            pattern = Pattern (xcells, ycells)
+
+            # Color indices in the file to color indices in the pattern
+            table = numpy.array ([0] + pattern.get_color_indices ([rgb for dmc, rgb in colors]),
+                                 dtype=numpy.uint16)
+            pattern.set_plane (table[plane])
+
+            self._set_pattern (pattern)
+
+            if history:
+                commands, position = history
+                commands = [Command (c.cells, table[c.old], table[c.new]) for c in commands]
+                self._commands.set_history (commands, position)
+
+        event.Skip()
+
+    def _save_pattern (self, event):
+
+        # The pattern is only half imported until the import is done
+        if self._import is not None:
+            return
+
+        path = wx.FileSelector ('Save the pattern',
+                               default_extension = 'stitchy',
+                               wildcard = "Stitchy pattern|*.stitchy",
+                               flags = wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+                               parent = self._frame)
+
+        if path:
+            self._finish_stroke ()
+
+            colors = [(self._dmc_codes.get (rgb, ''), rgb) for rgb in self._pattern.get_color_table ()]
+            try:
+                save_pattern (path, self._pattern.get_plane (), colors, self._commands.get_history ())
+            except IOError as e:
+                wx.MessageBox (str(e), 'Cannot save the pattern', wx.OK | wx.ICON_ERROR, self._frame)
+
+        event.Skip()
+
+    def _export_chart (self, event):
+
+        if self._import is not None:
+            return
+
+        path = wx.FileSelector ('Export the chart',
+                               default_extension = 'png',
+                               wildcard = "PNG|*.png",
+                               flags = wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+                               parent = self._frame)
+
+        if path:
+            cell_size = wx.GetNumberFromUser ('Size of every stitch in the chart, in pixels', 'Pixels',
+                                              'Export chart', 20, 3, 100, self._frame)
+            if cell_size < 0:
+                return
+
+            self._finish_stroke ()
+
+            wx.BeginBusyCursor ()
+            try:
+                export_chart (path, self._pattern, cell_size)
+            except IOError as e:
+                wx.MessageBox (str(e), 'Cannot export the chart', wx.OK | wx.ICON_ERROR, self._frame)
+            finally:
+                wx.EndBusyCursor ()
+
+        event.Skip()
+
     def _import_image (self, event):
 
+        if self._import is not None:
+            # Only one import at a time
+            return
+
         path = wx.FileSelector ('Choose an image',
                                wildcard = "BMP|*.bmp|GIF|*.gif|JPEG|*.jp*g|PNG|*.png|PCX|*.pcx|TIFF|*.tiff|Other|*",
                                flags = wx.FD_OPEN | wx.FD_FILE_MUST_EXIST,
                                parent = self._frame)
                             
         if path:
-            self._palette_dialog.Fit()
-            self._palette_dialog.ShowModal()
+            self._finish_stroke ()
+
             importer = ImageImporter ()
             importer.load_image (path)
-            importer.scale_image()
-            
-            height, width = importer.get_size ()
-
-            dc = wx.ClientDC (self._panel)
+            importer.scale_image(*self._pattern.get_dimensions())
 
-            self._panel.DoPrepareDC (dc)
+            # The image is loaded first so the palette dialog can choose its
+            # colors automatically
+            self._import_pixels = importer.get_pixels ()
+            self._palette_dialog.Fit()
+            self._palette_dialog.ShowModal()
+            self._import_pixels = None
+
+            # The image is matched in a worker thread, with the metric and
+            # dithering chosen in the palette dialog. The pixels are copied,
+            # as they belong to the wx.Image.
+            metric = METRICS[xrc.XRCCTRL (self._palette_dialog, 'MetricChoice').GetSelection ()]
+            matcher = self._matchers.get (self._current_palette, metric)
+            mode = DITHER_MODES[xrc.XRCCTRL (self._palette_dialog, 'DitherChoice').GetSelection ()]
+            pixels = numpy.array (importer.get_pixels ())
+            alpha = importer.get_alpha ()
+            if alpha is not None:
+                alpha = numpy.array (alpha)
+
+            colors = [tuple (rgb) for rgb in matcher.get_rgb ().tolist()]
+            self._import_table = numpy.array ([0] + self._pattern.get_color_indices (colors), dtype=numpy.uint16)
+            self._import_changes = []
+
+            # Without a parent, the progress dialog leaves the frame usable,
+            # so it can be scrolled and zoomed while the rows come in. Its
+            # maximum is one more than the rows, as a dialog that reaches
+            # it goes modal and runs _import_done, which destroys it, from
+            # inside Update. It is only closed by _import_done.
+            self._import_rows_total = len(pixels)
+            self._import_progress = wx.ProgressDialog ('Import image', 'Matching the colors of the image',
+                                                       len(pixels) + 1, None,
+                                                       wx.PD_CAN_ABORT | wx.PD_ELAPSED_TIME | wx.PD_REMAINING_TIME)
+
+            worker = ImportWorker (matcher, pixels, alpha, mode,
+                                   lambda y0, rows: wx.CallAfter (self._import_rows, worker, y0, rows),
+                                   lambda cancelled, error: wx.CallAfter (self._import_done, worker, cancelled, error))
+            self._import = worker
+            worker.start ()
 
-            for x in range (0, width):
-                for y in range (0, height):
-                    color = importer.get_color (x, y)
-                    bestcolor = self._find_closest_dmc_color (color)
-                    self._grid.add_cell (x, y, dc, bestcolor, False)
-            
         event.Skip()
 
+    @timed ('import_rows')
+    def _import_rows (self, worker, y0, rows):
+
+        # A batch of rows from the worker, applied with a single refresh.
+        # Empty cells in the pattern are left as they are.
+        if worker is not self._import:
+            return
+
+        xcells, ycells = self._pattern.get_dimensions ()
+        rows = rows[:max (0, ycells - y0), :xcells]
+        ys, xs = numpy.nonzero (rows)
+        cells = self._pattern.cell2index (xs, ys + y0)
+        values = self._import_table[rows[ys, xs]]
+
+        self._import_changes.append ((cells, self._pattern.get_cells (cells), values))
+        self._apply (cells, values)
+
+        # wx 2.8 returns whether to go on, later versions a tuple
+        result = self._import_progress.Update (min (y0 + len(rows), self._import_rows_total))
+        if isinstance (result, tuple):
+            result = result[0]
+        if not result:
+            worker.cancel ()
+
+    def _import_done (self, worker, cancelled, error):
+
+        if worker is not self._import:
+            return
+
+        self._import = None
+        self._import_progress.Destroy ()
+        self._import_progress = None
+
+        changes = self._import_changes
+        self._import_changes = []
+
+        if cancelled or error:
+            # Leave the pattern as it was before the import
+            for cells, old, new in reversed (changes):
+                self._apply (cells, old)
+            if error:
+                wx.MessageBox (error, 'Cannot import the image', wx.OK | wx.ICON_ERROR, self._frame)
+        elif changes:
+            # The whole import is a single command, undone at once
+            command = Command (numpy.concatenate ([c[0] for c in changes]),
+                               numpy.concatenate ([c[1] for c in changes]),
+                               numpy.concatenate ([c[2] for c in changes]))
+            self._commands.push (command)
+
+    def _cancel_import (self):
+
+        # Drops an import in progress, without undoing its changes. Rows
+        # still coming from the worker are ignored.
+        if self._import is not None:
+            self._import.cancel ()
+            self._import = None
+            self._import_progress.Destroy ()
+            self._import_progress = None
+            self._import_changes = []
+
     def _change_color (self, event):
 
         selection = self._color_choice.GetStringSelection()
@@ -296,95 +569,245 @@ class MyApp(wx.App):
 
         color, _name = self._colors[dmc]
 
-        red = int(color[1:3], 16)
-        green = int(color[3:5], 16)
-        blue = int(color[5:7], 16)
+        red, green, blue = code2rgb (color)
 
         self._current_color = wx.Colour (red=red, green=green, blue=blue)
 
         if event:
             event.Skip()
         
+    @timed ('mouse')
     def _print_cell (self, event):
 
         mousex, mousey = self._panel.CalcUnscrolledPosition(event.GetX(), event.GetY())
 
         self._current_mouse_pos = (mousex, mousey)
-        color = self._grid.get_color_by_mouse (mousex, mousey)
-        if not color:
-            color_name = 'None'
-        else:
-            color_name = self._find_dmc_color (color)
-            
-        self._statusbar.SetStatusText('Color: %s' % str(color_name))
+        cell = self._grid.mouse2cell (mousex, mousey)
+
+        if cell != self._hover_cell:
+            self._hover_cell = cell
+
+            color = self._grid.get_color_by_mouse (mousex, mousey)
+            if not color:
+                color_name = 'None'
+            else:
+                color_name = self._find_dmc_color (color)
+
+            self._statusbar.SetStatusText('Color: %s' % str(color_name))
+
+            if event.Moving():
+                self._timer.Start(3000,True)
         
-        if event.GetButton() == wx.MOUSE_BTN_LEFT or event.Dragging():
+        # No editing while an image is being imported
+        if self._import is None:
+            self._use_tool (event, cell)
 
-            dc = wx.ClientDC (event.GetEventObject())
-            self._panel.DoPrepareDC (dc)
-                
-            xcell, ycell = self._grid.mouse2cell (mousex, mousey)
-            color_index = self._grid.add_cell (xcell, ycell, dc, self._current_color, self._erase_tool)
-            # Add operation for undo and redo
-            op = (xcell, ycell, color_index, self._erase_tool)
-            if (len(self._operations) == 0) or (not op in self._operations):
-                self._operations.append (op)
-                self._current_operation = len(self._operations) - 1
-
-        elif event.Moving():
-            self._timer.Start(3000,True)
+        # A stroke becomes a single command once the button is released
+        if event.LeftUp() or not event.LeftIsDown():
+            self._finish_stroke ()
                 
         event.Skip()
 
+    def _use_tool (self, event, cell):
+
+        if self._tool in ('editgrid', 'erase'):
+            # Drags only queue the cell, the queue is painted once per idle
+            # event
+            if event.GetButton() == wx.MOUSE_BTN_LEFT or event.Dragging():
+                if not self._drag_cells or self._drag_cells[-1] != cell:
+                    self._drag_cells.append (cell)
+
+        elif self._tool == 'rectangle':
+            # Filled when the button is released, between the cells where it
+            # was pressed and released
+            if event.LeftDown():
+                self._rectangle_start = cell
+            elif event.LeftUp() and self._rectangle_start is not None:
+                self._fill_rectangle (self._rectangle_start, cell)
+                self._rectangle_start = None
+
+        elif event.LeftDown():
+            self._fill_area (cell)
+
+    def _fill_area (self, cell):
+
+        # Bucket fill, or every cell of the same color with the replace tool
+        xcell, ycell = cell
+        if not self._pattern.in_grid (xcell, ycell):
+            return
+
+        plane = self._pattern.get_plane ()
+        if self._tool == 'fill':
+            mask = flood_fill (plane, xcell, ycell)
+        else:
+            mask = color_mask (plane, plane[xcell, ycell])
+
+        self._fill_mask (mask)
+
+    def _fill_rectangle (self, start, end):
+
+        x0, y0 = start
+        x1, y1 = end
+        self._fill_mask (rectangle_mask (self._pattern.get_dimensions (), x0, y0, x1, y1))
+
+    def _fill_mask (self, mask):
+
+        # Paints the cells of a mask with the current color, as a single
+        # command and a single refresh
+        xs, ys = numpy.nonzero (mask)
+        cells = self._pattern.cell2index (xs, ys)
+        old = self._pattern.get_cells (cells)
+
+        values = numpy.empty (len(cells), dtype=numpy.uint16)
+        values[:] = self._pattern.get_color_index (self._current_color.Get ())
+
+        changed = old != values
+        if changed.any ():
+            command = Command (cells[changed], old[changed], values[changed])
+            self._apply (command.cells, command.new)
+            self._commands.push (command)
+
+            # The color under the mouse may have changed
+            self._hover_cell = None
+
+    @timed ('remove_confetti')
+    def _remove_confetti (self, event):
+
+        # Merges the small regions left by an import into the colors around
+        # them, as a single command
+        if self._import is not None:
+            return
+
+        size = wx.GetNumberFromUser ('Regions with fewer stitches take the color around them', 'Stitches',
+                                     'Remove confetti', self._confetti_size, 2, 100, self._frame)
+        if size < 0:
+            return
+
+        self._confetti_size = size
+        self._finish_stroke ()
+
+        wx.BeginBusyCursor ()
+        try:
+            plane = self._pattern.get_plane ()
+            cleaned = remove_confetti (plane, size)
+        finally:
+            wx.EndBusyCursor ()
+
+        xs, ys = numpy.nonzero (cleaned != plane)
+        if len(xs):
+            command = Command (self._pattern.cell2index (xs, ys), plane[xs, ys], cleaned[xs, ys])
+            self._apply (command.cells, command.new)
+            self._commands.push (command)
+            self._hover_cell = None
+
+        event.Skip()
+
+    def _show_thread_usage (self, event):
+
+        # Comes from the counts kept by the pattern, so it is cheap even
+        # for big patterns
+        self._finish_stroke ()
+
+        usage = [(self._color_names.get (rgb, 'RGB %d, %d, %d' % rgb), stitches)
+                 for rgb, stitches in self._pattern.get_usage ()]
+
+        dialog = wx.lib.dialogs.ScrolledMessageDialog (self._frame, usage_report (usage), 'Thread usage', size=(700, 500))
+        dialog.ShowModal ()
+        dialog.Destroy ()
+
+        event.Skip()
+
+    def _apply_drag (self, event = None):
+
+        if self._drag_cells:
+            # Join the queued cells, and the last one painted, with lines so
+            # fast drags leave no gaps
+            points = self._drag_cells
+            if self._drag_last is not None:
+                points = [self._drag_last] + points
+            self._drag_cells = []
+            self._drag_last = points[-1]
+
+            self._paint_cells (*path_cells (points))
+
+        if event is not None:
+            event.Skip()
+
+    def _paint_cells (self, xs, ys):
+
+        xcells, ycells = self._pattern.get_dimensions ()
+        inside = (xs >= 0) & (ys >= 0) & (xs < xcells) & (ys < ycells)
+        cells = numpy.unique (self._pattern.cell2index (xs[inside], ys[inside]))
+        if not len(cells):
+            return
+
+        if self._tool == 'erase':
+            index = 0
+        else:
+            index = self._pattern.get_color_index (self._current_color.Get ())
+
+        values = numpy.empty (len(cells), dtype=numpy.uint16)
+        values[:] = index
+
+        # Record the change for undo and redo
+        if self._stroke is None:
+            self._stroke = Stroke ()
+        self._stroke.add_cells (cells, self._pattern.get_cells (cells), values)
+
+        self._apply (cells, values)
+
+        # The color under the mouse may have changed
+        self._hover_cell = None
+
+    def _finish_stroke (self):
+
+        self._apply_drag ()
+        self._drag_last = None
+
+        if self._stroke is not None:
+            command = self._stroke.get_command ()
+            if command is not None:
+                self._commands.push (command)
+            self._stroke = None
+
+    def _apply (self, cells, values):
+
+        cell_range = self._pattern.set_cells (cells, values)
+        if cell_range is not None:
+            self._refresh_range (*cell_range)
+
+    def _refresh_range (self, x0, y0, x1, y1):
+
+        self._canvas.update_range (x0, y0, x1, y1)
+
+        rect = self._grid.get_range_rect (x0, y0, x1, y1)
+        rect.SetPosition (self._panel.CalcScrolledPosition (rect.GetPosition()))
+        self._panel.RefreshRect (rect)
+
+    @timed ('undo')
     def _undo (self, event):
 
-        if self._current_operation:
-            op = self._operations[self._current_operation]
-            
-            xcell, ycell,  color_index, erase = op
+        if self._import is not None:
+            return
 
-            dc = wx.ClientDC (self._panel)
-            self._panel.DoPrepareDC (dc)
+        self._finish_stroke ()
 
-            if erase:
-                if color_index > 0:
-                    cur_color = self._grid.get_color_by_index (xcell, ycell, color_index-1) 
-                    self._grid.add_cell (xcell, ycell, dc, cur_color, False)                    
-            else:
-                if color_index > 0:
-                    cur_color = self._grid.get_color_by_index (xcell, ycell, color_index-1)
-                    self._grid.add_cell (xcell, ycell, dc, cur_color, False)                    
-                else:
-                    self._grid.add_cell (xcell, ycell, dc, None, True)                    
-            
-            self._current_operation = self._current_operation - 1
-            if self._current_operation < 0:
-                self._current_operation = None
+        command = self._commands.undo ()
+        if command is not None:
+            self._apply (command.cells, command.old)
 
+    @timed ('redo')
     def _redo (self, event):
-        if not self._current_operation:
-            self._current_operation = 0
 
-        try:
-            op = self._operations[self._current_operation+1]
-            xcell, ycell, color_index, erase = op
+        if self._import is not None:
+            return
 
-            cur_color = self._grid.get_color_by_index (xcell, ycell, color_index)
-            
-            dc = wx.ClientDC (self._panel)
-            self._panel.DoPrepareDC (dc)
-            if erase:
-                self._grid.add_cell (xcell, ycell, dc, None, True)
-            else:
-                self._grid.add_cell (xcell, ycell, dc, cur_color, False)
+        self._finish_stroke ()
 
-            self._current_operation += 1
-            
-        except IndexError:
-            # No actions to redo
-            pass
+        command = self._commands.redo ()
+        if command is not None:
+            self._apply (command.cells, command.new)
 
-        
     def _set_zoom (self, event):
 
         if event.GetId() == xrc.XRCID('zoomout'):
@@ -396,19 +819,21 @@ class MyApp(wx.App):
         self._panel.SetVirtualSize(size)
         self._panel.FitInside()
         
-        self._panel.SetScrollRate(size[0]/10, size[1]/10)
+        self._panel.SetScrollRate(self._scroll_rate, self._scroll_rate)
         self._panel.Refresh()
         event.Skip()
 
     def _set_edit (self, event):
 
-        if event.GetId() == xrc.XRCID('editgrid'):
-            self._erase_tool = False
-        elif event.GetId() == xrc.XRCID('erase'):
-            self._erase_tool = True
+        for tool in self._tools:
+            if event.GetId() == xrc.XRCID(tool):
+                self._tool = tool
+
+        self._finish_stroke ()
+        self._rectangle_start = None
 
-        self._toolbar.ToggleTool (xrc.XRCID('editgrid'), not self._erase_tool)
-        self._toolbar.ToggleTool (xrc.XRCID('erase'), self._erase_tool)
+        for tool in self._tools:
+            self._toolbar.ToggleTool (xrc.XRCID(tool), tool == self._tool)
             
         event.Skip()
 
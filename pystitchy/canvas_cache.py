@@ -0,0 +1,161 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import wx
+from collections import OrderedDict
+
+class TileSet:
+
+    def __init__ (self):
+
+        # Rendered tiles by (column, row), and ranges of cells edited since
+        # the tiles were last used
+        self.tiles = OrderedDict ()
+        self.dirty = []
+
+class CanvasCache:
+
+    # Off-screen copy of the rendered grid, split in tiles that are drawn
+    # lazily the first time they are shown. A tile set is kept for each of
+    # the last few zoom levels, so going back to one of them is instant.
+
+    def __init__ (self, grid, background, tile_size = 256, levels = 3, max_dirty = 1000, max_tiles = 200):
+
+        self._grid = grid
+        self._background = wx.Brush (background)
+        self._tile_size = tile_size
+        self._max_levels = levels
+        self._max_dirty = max_dirty
+        self._max_tiles = max_tiles
+
+        self._levels = OrderedDict ()
+
+    def clear (self):
+
+        self._levels.clear ()
+
+    def draw (self, dc, rects):
+
+        # Blit the tiles overlapping rects, in unscrolled coordinates, into
+        # an already prepared dc
+        tileset = self._get_tileset ()
+
+        ts = self._tile_size
+        width, height = self._grid.get_size ()
+
+        drawn = set ()
+        for rect in rects:
+            tx0 = max (rect.GetLeft (), 0) // ts
+            ty0 = max (rect.GetTop (), 0) // ts
+            tx1 = min (rect.GetRight (), width - 1) // ts
+            ty1 = min (rect.GetBottom (), height - 1) // ts
+
+            for tx in range (tx0, tx1 + 1):
+                for ty in range (ty0, ty1 + 1):
+                    if (tx, ty) in drawn:
+                        continue
+                    drawn.add ((tx, ty))
+
+                    # Keep the tiles in least recently used order, so
+                    # large patterns do not end up cached as a whole
+                    tile = tileset.tiles.pop ((tx, ty), None)
+                    if tile is None:
+                        tile = self._render_tile (tx, ty)
+                    tileset.tiles[(tx, ty)] = tile
+
+                    while len(tileset.tiles) > self._max_tiles:
+                        tileset.tiles.popitem (last=False)
+
+                    dc.DrawBitmap (tile, tx*ts, ty*ts)
+
+    def update_range (self, x0, y0, x1, y1):
+
+        # Tiles at the current zoom level are redrawn right away, the rest
+        # are updated when their zoom level is used again
+        current = self._grid.get_size ()
+
+        for key, tileset in self._levels.items ():
+            if key == current:
+                self._redraw_range (tileset, x0, y0, x1, y1)
+            elif len(tileset.dirty) < self._max_dirty:
+                tileset.dirty.append ((x0, y0, x1, y1))
+            else:
+                # Too many changes, cheaper to start from scratch
+                tileset.tiles.clear ()
+                tileset.dirty = []
+
+    def _get_tileset (self):
+
+        key = self._grid.get_size ()
+
+        tileset = self._levels.pop (key, None)
+        if tileset is None:
+            tileset = TileSet ()
+        self._levels[key] = tileset
+
+        while len(self._levels) > self._max_levels:
+            self._levels.popitem (last=False)
+
+        for x0, y0, x1, y1 in tileset.dirty:
+            self._redraw_range (tileset, x0, y0, x1, y1)
+        tileset.dirty = []
+
+        return tileset
+
+    def _render_tile (self, tx, ty):
+
+        ts = self._tile_size
+        width, height = self._grid.get_size ()
+
+        w = min (ts, width - tx*ts)
+        h = min (ts, height - ty*ts)
+
+        tile = wx.EmptyBitmap (w, h)
+
+        dc = wx.MemoryDC (tile)
+        dc.SetDeviceOrigin (-tx*ts, -ty*ts)
+        dc.SetBackground (self._background)
+        dc.Clear ()
+        self._grid.draw_grid (dc, [wx.Rect (tx*ts, ty*ts, w, h)])
+        dc.SelectObject (wx.NullBitmap)
+
+        return tile
+
+    def _redraw_range (self, tileset, x0, y0, x1, y1):
+
+        ts = self._tile_size
+        rect = self._grid.get_range_rect (x0, y0, x1, y1)
+
+        for tx in range (rect.GetLeft () // ts, rect.GetRight () // ts + 1):
+            for ty in range (rect.GetTop () // ts, rect.GetBottom () // ts + 1):
+                tile = tileset.tiles.get ((tx, ty))
+                if tile is None:
+                    # Not rendered yet, it will be up to date when it is
+                    continue
+
+                dc = wx.MemoryDC (tile)
+                dc.SetDeviceOrigin (-tx*ts, -ty*ts)
+                dc.SetClippingRect (rect)
+                dc.SetPen (wx.TRANSPARENT_PEN)
+                dc.SetBrush (self._background)
+                dc.DrawRectangleRect (rect)
+                self._grid.draw_grid (dc, [rect])
+                dc.SelectObject (wx.NullBitmap)
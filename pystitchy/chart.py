@@ -0,0 +1,123 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import struct
+import zlib
+import numpy
+
+LINE_COLOR = (192, 192, 192)
+BOLD_LINE_COLOR = (0, 0, 0)
+BACKGROUND = (255, 255, 255)
+
+def get_chart_size (pattern, cell_size):
+
+    # Size in pixels of the chart of a pattern, with a line around every
+    # cell
+    xcells, ycells = pattern.get_dimensions ()
+
+    return (xcells * cell_size + 1, ycells * cell_size + 1)
+
+def _line_colors (ncells, cell_size):
+
+    # Color of the line at every pixel along an axis, as an index in
+    # (no line, line, bold line). Every 10th line is bold, like in the grid
+    # view.
+    size = ncells * cell_size + 1
+    lines = numpy.zeros (size, dtype=numpy.uint8)
+    positions = numpy.arange (ncells + 1)
+    lines[positions * cell_size] = 1
+    lines[positions[positions % 10 == 0] * cell_size] = 2
+
+    return lines
+
+def render_chart (pattern, cell_size = 10, y0 = 0, y1 = None):
+
+    # RGB image, with shape (height, width, 3), of the rows of cells y0 to
+    # y1 (excluded), with the lines above them. The line below the last row
+    # of the pattern is only included in the last strip.
+    xcells, ycells = pattern.get_dimensions ()
+    if y1 is None:
+        y1 = ycells
+
+    table = numpy.array ([BACKGROUND] + list (pattern.get_color_table ()), dtype=numpy.uint8)
+    cells = pattern.read (0, y0, xcells, y1).T
+
+    # One row of pixels per row of cells, then repeated to the cell size.
+    # The last pixel of each axis is the closing line.
+    height = (y1 - y0) * cell_size + (1 if y1 == ycells else 0)
+    width = xcells * cell_size + 1
+    columns = numpy.minimum (numpy.arange (width) // cell_size, xcells - 1)
+
+    repeats = numpy.empty (y1 - y0, dtype=numpy.intp)
+    repeats[:] = cell_size
+    repeats[-1:] += height - (y1 - y0) * cell_size
+
+    image = numpy.repeat (table[cells[:, columns]], repeats, axis=0)
+
+    # Normal lines first and then bold lines on top of them
+    xlines = _line_colors (xcells, cell_size)
+    ylines = _line_colors (ycells, cell_size)[y0 * cell_size:y0 * cell_size + height]
+    for kind, color in ((1, LINE_COLOR), (2, BOLD_LINE_COLOR)):
+        image[:, xlines == kind] = color
+        image[ylines == kind, :] = color
+
+    return image
+
+def _png_chunk (kind, data):
+
+    return struct.pack ('>I', len(data)) + kind + data + struct.pack ('>I', zlib.crc32 (kind + data) & 0xffffffff)
+
+def export_chart (path, pattern, cell_size = 10, strip_rows = 32):
+
+    # Writes the chart of a pattern as a PNG file. It is rendered and
+    # compressed in strips of rows, so big charts never need to be in
+    # memory as a whole.
+    xcells, ycells = pattern.get_dimensions ()
+    width, height = get_chart_size (pattern, cell_size)
+
+    f = open (path, 'wb')
+    try:
+        f.write ('\x89PNG\r\n\x1a\n')
+        f.write (_png_chunk ('IHDR', struct.pack ('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+
+        compressor = zlib.compressobj (6)
+        previous = numpy.zeros (width * 3, dtype=numpy.uint8)
+        for y0 in range (0, ycells, strip_rows):
+            image = render_chart (pattern, cell_size, y0, min (y0 + strip_rows, ycells))
+            image = image.reshape (len(image), -1)
+
+            # Every scanline starts with its filter type. Up (2) stores the
+            # difference with the scanline above, which is all zeros inside
+            # a row of cells and compresses very well.
+            scanlines = numpy.empty ((len(image), width * 3 + 1), dtype=numpy.uint8)
+            scanlines[:,0] = 2
+            scanlines[0,1:] = image[0] - previous
+            scanlines[1:,1:] = image[1:] - image[:-1]
+            previous = image[-1]
+
+            data = compressor.compress (scanlines.tostring ())
+            if data:
+                f.write (_png_chunk ('IDAT', data))
+
+        f.write (_png_chunk ('IDAT', compressor.flush ()))
+        f.write (_png_chunk ('IEND', ''))
+    finally:
+        f.close ()
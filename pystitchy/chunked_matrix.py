@@ -0,0 +1,195 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy
+
+class ChunkedMatrix:
+
+    # A 2D matrix of width x height values, indexed as [x, y], stored in
+    # square chunks that are only allocated when a non zero value is written
+    # to them. Missing chunks read as zeros, so a mostly empty matrix takes
+    # little memory.
+
+    def __init__ (self, width, height, chunk_size = 64, dtype = numpy.uint16):
+
+        self._width = width
+        self._height = height
+        self._chunk_size = chunk_size
+        self._dtype = dtype
+
+        # Chunks by (column, row)
+        self._chunks = {}
+
+    def get_shape (self):
+
+        return (self._width, self._height)
+
+    def get (self, x, y):
+
+        cs = self._chunk_size
+        chunk = self._chunks.get ((x // cs, y // cs))
+        if chunk is None:
+            return 0
+
+        return chunk[x % cs, y % cs]
+
+    def set (self, x, y, value):
+
+        cs = self._chunk_size
+        chunk = self._chunks.get ((x // cs, y // cs))
+        if chunk is None:
+            if not value:
+                return
+            chunk = self._new_chunk (x // cs, y // cs)
+
+        chunk[x % cs, y % cs] = value
+
+    def get_flat (self, cells):
+
+        # Values of an array of flat indices, x * height + y
+        cells = numpy.asarray (cells)
+
+        dense = self._dense_bounds (cells)
+        if dense is not None:
+            x0, x1 = dense
+            region = self.read (x0, 0, x1, self._height)
+            return region.ravel ()[cells - x0 * self._height]
+
+        values = numpy.zeros (len(cells), dtype=self._dtype)
+
+        for key, positions, xs, ys in self._group (cells):
+            chunk = self._chunks.get (key)
+            if chunk is not None:
+                values[positions] = chunk[xs, ys]
+
+        return values
+
+    def set_flat (self, cells, values):
+
+        # A cell repeated in cells ends up with its last value
+        cells = numpy.asarray (cells)
+        values = numpy.asarray (values, dtype=self._dtype)
+        if not values.ndim:
+            values = numpy.repeat (values, len(cells))
+
+        dense = self._dense_bounds (cells)
+        if dense is not None:
+            x0, x1 = dense
+            region = self.read (x0, 0, x1, self._height)
+            region.ravel ()[cells - x0 * self._height] = values
+            self.write (x0, 0, region)
+            return
+
+        for key, positions, xs, ys in self._group (cells):
+            chunk = self._chunks.get (key)
+            if chunk is None:
+                if not values[positions].any ():
+                    continue
+                chunk = self._new_chunk (*key)
+            chunk[xs, ys] = values[positions]
+
+    def read (self, x0, y0, x1, y1):
+
+        # Dense copy of the values in [x0, x1) x [y0, y1)
+        region = numpy.zeros ((x1 - x0, y1 - y0), dtype=self._dtype)
+
+        for cx, cy, ox0, oy0, ox1, oy1 in self._overlapping (x0, y0, x1, y1):
+            chunk = self._chunks.get ((cx, cy))
+            if chunk is not None:
+                cs = self._chunk_size
+                region[ox0-x0:ox1-x0, oy0-y0:oy1-y0] = chunk[ox0-cx*cs:ox1-cx*cs, oy0-cy*cs:oy1-cy*cs]
+
+        return region
+
+    def write (self, x0, y0, values):
+
+        # Copy a dense array of values to the matrix, starting at (x0, y0)
+        values = numpy.asarray (values, dtype=self._dtype)
+        x1 = x0 + values.shape[0]
+        y1 = y0 + values.shape[1]
+
+        for cx, cy, ox0, oy0, ox1, oy1 in self._overlapping (x0, y0, x1, y1):
+            part = values[ox0-x0:ox1-x0, oy0-y0:oy1-y0]
+            chunk = self._chunks.get ((cx, cy))
+            if chunk is None:
+                if not part.any ():
+                    continue
+                chunk = self._new_chunk (cx, cy)
+            cs = self._chunk_size
+            chunk[ox0-cx*cs:ox1-cx*cs, oy0-cy*cs:oy1-cy*cs] = part
+
+    def clear (self):
+
+        self._chunks = {}
+
+    def _new_chunk (self, cx, cy):
+
+        chunk = numpy.zeros ((self._chunk_size, self._chunk_size), dtype=self._dtype)
+        self._chunks[(cx, cy)] = chunk
+        return chunk
+
+    def _overlapping (self, x0, y0, x1, y1):
+
+        # Chunks overlapping [x0, x1) x [y0, y1), with the part of the
+        # range that falls in each of them
+        cs = self._chunk_size
+        for cx in range (x0 // cs, (x1 - 1) // cs + 1):
+            for cy in range (y0 // cs, (y1 - 1) // cs + 1):
+                yield (cx, cy,
+                       max (x0, cx*cs), max (y0, cy*cs),
+                       min (x1, (cx+1)*cs), min (y1, (cy+1)*cs))
+
+    def _dense_bounds (self, cells):
+
+        # Big batches that cover a good part of their bounding box, like
+        # fills, are faster to do on a dense copy of the box than chunk by
+        # chunk. The box spans whole columns, so flat indices can be used
+        # directly. Returns the columns [x0, x1) of the box, or None.
+        if len(cells) < 4096:
+            return None
+
+        x0 = int(cells.min ()) // self._height
+        x1 = int(cells.max ()) // self._height + 1
+        if (x1 - x0) * self._height > 4 * len(cells):
+            return None
+
+        return (x0, x1)
+
+    def _group (self, cells):
+
+        # Splits flat indices by chunk. Yields the chunk key, the positions
+        # in cells that fall in it, and their coordinates inside the chunk.
+        if not len(cells):
+            return
+
+        cs = self._chunk_size
+        xs, ys = numpy.divmod (cells, self._height)
+        keys = (xs // cs) * ((self._height - 1) // cs + 1) + ys // cs
+
+        order = keys.argsort (kind='mergesort')
+        unique, starts = numpy.unique (keys[order], return_index=True)
+        ends = numpy.append (starts[1:], len(order))
+
+        for start, end in zip (starts.tolist(), ends.tolist()):
+            positions = order[start:end]
+            cx = int(xs[positions[0]]) // cs
+            cy = int(ys[positions[0]]) // cs
+            yield ((cx, cy), positions, xs[positions] - cx*cs, ys[positions] - cy*cs)
@@ -0,0 +1,72 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import wx
+
+class ColorListBox (wx.HtmlListBox):
+
+    # Virtual list of colors, showing a subset of the palette given by
+    # palette indices. Rows are only rendered when they are shown.
+
+    def __init__ (self, parent, id, dmcs, colors, size):
+
+        wx.HtmlListBox.__init__ (self, parent, id, size=size, style=wx.HLB_MULTIPLE)
+
+        # The palette index of a color is its position in dmcs, colors
+        # being the dict dmc -> (code, name)
+        self._dmcs = dmcs
+        self._colors = colors
+        self._items = []
+
+    def set_items (self, items):
+
+        # Palette indices to show, always in palette order
+        self._items = sorted (items)
+
+        self.DeselectAll ()
+        self.SetItemCount (len(self._items))
+        self.Refresh ()
+
+    def get_items (self):
+
+        return self._items
+
+    def get_selected_items (self):
+
+        selected = []
+        item, cookie = self.GetFirstSelected ()
+
+        while wx.NOT_FOUND != item:
+            selected.append (self._items[item])
+            item, cookie = self.GetNextSelected (cookie)
+
+        return selected
+
+    def get_dmc (self, index):
+
+        return self._dmcs[index]
+
+    def OnGetItem (self, n):
+
+        dmc = self._dmcs[self._items[n]]
+        code, name = self._colors[dmc]
+
+        return '<table><tr><td bgcolor="%s" colspan="15" nowrap> </td><td>%s #%s</td></tr></table>' % (code[0:7], name, dmc)
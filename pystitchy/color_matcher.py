@@ -0,0 +1,212 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy
+from collections import OrderedDict
+from colorspace import rgb2lab, delta_e_76, delta_e_94, delta_e_2000
+
+# Color differences to choose from. redmean works on RGB values and the
+# others on CIELAB values.
+METRICS = ('redmean', 'cie76', 'cie94', 'ciede2000')
+LAB_METRICS = {'cie76': delta_e_76, 'cie94': delta_e_94, 'ciede2000': delta_e_2000}
+
+def code2rgb (code):
+
+    return (int(code[1:3], 16), int(code[3:5], 16), int(code[5:7], 16))
+
+class ColorMatcher:
+
+    def __init__ (self, palette, metric = 'redmean', chunk_size = 4096, max_lut_size = 1 << 20,
+                  candidates = 16):
+
+        # palette is a dict dmc -> (code, name), as loaded from the colors file
+        if not palette:
+            raise ValueError ('Cannot match colors against an empty palette')
+        if metric not in METRICS:
+            raise ValueError ('Unknown color metric %s' % metric)
+
+        self._dmcs = list(palette.keys())
+        self._rgb = numpy.array ([code2rgb (palette[dmc][0]) for dmc in self._dmcs],
+                                 dtype=numpy.int32)
+        self._chunk_size = chunk_size
+
+        # Sparse RGB lookup table, filled lazily with the colors seen so
+        # far. Keys are packed 0xRRGGBB values kept sorted, so a whole image
+        # can be looked up at once with searchsorted.
+        self._max_lut_size = max_lut_size
+        self._lut_keys = numpy.zeros (0, dtype=numpy.uint32)
+        self._lut_values = numpy.zeros (0, dtype=numpy.uint16)
+
+        # Palette channels as rows, ready to broadcast against a column of pixels
+        self._pr = self._rgb[:,0].astype(numpy.float32)[numpy.newaxis,:]
+        self._pg = self._rgb[:,1].astype(numpy.float32)[numpy.newaxis,:]
+        self._pb = self._rgb[:,2].astype(numpy.float32)[numpy.newaxis,:]
+
+        # Perceptual metrics compare Lab values, computed once for the
+        # palette. CIEDE2000 is only worked out for the palette colors
+        # closest to every pixel by CIE94, which nearly always include the
+        # closest one by CIEDE2000.
+        self._metric = metric
+        self._lab = rgb2lab (self._rgb)
+        self._candidates = min (candidates, len(self._rgb))
+
+    def get_dmcs (self):
+
+        return self._dmcs
+
+    def get_rgb (self):
+
+        return self._rgb
+
+    def match (self, pixels):
+
+        # pixels is an array of shape (..., 3); returns the palette index of
+        # the closest color for every pixel, with shape (...)
+        pixels = numpy.asarray (pixels)
+        shape = pixels.shape[:-1]
+        flat = pixels.reshape (-1, 3).astype (numpy.uint32)
+
+        packed = (flat[:,0] << 16) | (flat[:,1] << 8) | flat[:,2]
+        keys, inverse = numpy.unique (packed, return_inverse=True)
+
+        values = numpy.empty (len(keys), dtype=numpy.uint16)
+        pos = numpy.searchsorted (self._lut_keys, keys)
+        found = pos < len(self._lut_keys)
+        found[found] = self._lut_keys[pos[found]] == keys[found]
+        values[found] = self._lut_values[pos[found]]
+
+        missing = keys[~found]
+        if len(missing):
+            rgb = numpy.column_stack ((missing >> 16, (missing >> 8) & 0xff, missing & 0xff))
+            values[~found] = self._match_pixels (rgb)
+            self._update_lut (missing, values[~found], pos[~found])
+
+        return values[inverse].astype (numpy.intp).reshape (shape)
+
+    def _update_lut (self, keys, values, positions):
+
+        if len(self._lut_keys) + len(keys) > self._max_lut_size:
+            # Start over rather than growing without bounds
+            if len(keys) > self._max_lut_size:
+                return
+            self._lut_keys = keys
+            self._lut_values = values
+            return
+
+        # keys are sorted and positions come from searchsorted, so inserting
+        # keeps the table sorted without sorting it again
+        self._lut_keys = numpy.insert (self._lut_keys, positions, keys)
+        self._lut_values = numpy.insert (self._lut_values, positions, values)
+
+    def _match_pixels (self, flat):
+
+        indices = numpy.empty (len(flat), dtype=numpy.intp)
+
+        # Work in chunks, so the pixels x palette distance matrix stays small
+        for start in range (0, len(flat), self._chunk_size):
+            chunk = flat[start:start+self._chunk_size]
+            indices[start:start+len(chunk)] = self._match_chunk (chunk)
+
+        return indices
+
+    def get_distances (self, pixels):
+
+        # Distance from every pixel, with shape (n, 3), to every palette
+        # color, with shape (n, palette size). Only meant for a few pixels;
+        # use match for images.
+        return self._distances (numpy.asarray (pixels).reshape (-1, 3))
+
+    def _match_chunk (self, chunk):
+
+        if self._metric != 'ciede2000' or self._candidates == len(self._lab):
+            return self._distances (chunk).argmin (axis=1)
+
+        lab = rgb2lab (chunk)[:,numpy.newaxis,:]
+
+        # Coarse pass, keeping the closest palette colors by CIE94, then the
+        # fine pass over those only
+        coarse = delta_e_94 (lab, self._lab[numpy.newaxis,:,:])
+        candidates = coarse.argpartition (self._candidates - 1, axis=1)[:,:self._candidates]
+        fine = delta_e_2000 (lab, self._lab[candidates])
+        rows = numpy.arange (len(chunk))
+
+        return candidates[rows, fine.argmin (axis=1)]
+
+    def _distances (self, chunk):
+
+        if self._metric in LAB_METRICS:
+            lab = rgb2lab (chunk)[:,numpy.newaxis,:]
+            return LAB_METRICS[self._metric] (lab, self._lab[numpy.newaxis,:,:])
+
+        red = chunk[:,0].astype(numpy.float32)[:,numpy.newaxis]
+        green = chunk[:,1].astype(numpy.float32)[:,numpy.newaxis]
+        blue = chunk[:,2].astype(numpy.float32)[:,numpy.newaxis]
+
+        # Redmean weighted RGB distance,
+        #   (2+r/256)*dr**2 + 4*dg**2 + (2+(255-r)/256)*db**2
+        # with r the mean red, rearranged to work in place. The square root
+        # is not needed to find the minimum.
+        dr = self._pr - red
+        dr *= dr
+        db = self._pb - blue
+        db *= db
+
+        rmean = self._pr + red
+        rmean *= 1.0 / 512
+
+        distance = dr - db
+        distance *= rmean
+        dr *= 2
+        distance += dr
+        db *= 2 + 255.0 / 256
+        distance += db
+
+        dg = self._pg - green
+        dg *= dg
+        dg *= 4
+        distance += dg
+
+        return distance
+
+
+class MatcherCache:
+
+    def __init__ (self, size = 4):
+
+        self._size = size
+        self._matchers = OrderedDict ()
+
+    def get (self, palette, metric = 'redmean'):
+
+        # Palettes are identified by their set of DMC codes, so switching
+        # back to a previous selection reuses its lookup table
+        key = (metric, tuple (sorted (palette.keys())))
+
+        matcher = self._matchers.pop (key, None)
+        if matcher is None:
+            matcher = ColorMatcher (palette, metric)
+
+        self._matchers[key] = matcher
+
+        while len(self._matchers) > self._size:
+            self._matchers.popitem (last=False)
+
+        return matcher
@@ -0,0 +1,125 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy
+
+# sRGB to XYZ, D65 white point
+RGB2XYZ = numpy.array ([[0.4124564, 0.3575761, 0.1804375],
+                        [0.2126729, 0.7151522, 0.0721750],
+                        [0.0193339, 0.1191920, 0.9503041]])
+WHITE = numpy.array ([0.95047, 1.0, 1.08883])
+
+def rgb2lab (rgb):
+
+    # CIELAB values for sRGB colors, with shape (..., 3)
+    rgb = numpy.asarray (rgb, dtype=numpy.float64) / 255.0
+    linear = numpy.where (rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+
+    xyz = numpy.dot (linear, RGB2XYZ.T) / WHITE
+    f = numpy.where (xyz > 216.0 / 24389, numpy.cbrt (xyz), (24389.0 / 27 * xyz + 16) / 116)
+
+    lab = numpy.empty (xyz.shape)
+    lab[...,0] = 116 * f[...,1] - 16
+    lab[...,1] = 500 * (f[...,0] - f[...,1])
+    lab[...,2] = 200 * (f[...,1] - f[...,2])
+
+    return lab
+
+# Color differences between Lab colors. Arguments broadcast against each
+# other, with the channels in the last axis. All of them return squared
+# distances, which keep the same order while skipping a square root per
+# pair, so the square root of the result is the usual Delta E.
+
+def delta_e_76 (lab1, lab2):
+
+    # Squared euclidean distance
+    return ((lab1 - lab2) ** 2).sum (axis=-1)
+
+def delta_e_94 (lab1, lab2):
+
+    # Squared CIE94 distance, with graphic arts weights and lab1 as the
+    # reference color
+    l1, a1, b1 = lab1[...,0], lab1[...,1], lab1[...,2]
+    l2, a2, b2 = lab2[...,0], lab2[...,1], lab2[...,2]
+
+    c1 = numpy.hypot (a1, b1)
+    c2 = numpy.hypot (a2, b2)
+    dc = c1 - c2
+    dh2 = (a1 - a2) ** 2 + (b1 - b2) ** 2 - dc ** 2
+
+    return (l1 - l2) ** 2 + (dc / (1 + 0.045 * c1)) ** 2 + numpy.maximum (dh2, 0) / (1 + 0.015 * c1) ** 2
+
+def delta_e_2000 (lab1, lab2):
+
+    # Squared CIEDE2000 distance
+    l1, a1, b1 = lab1[...,0], lab1[...,1], lab1[...,2]
+    l2, a2, b2 = lab2[...,0], lab2[...,1], lab2[...,2]
+
+    cmean = (numpy.hypot (a1, b1) + numpy.hypot (a2, b2)) / 2
+    cmean7 = cmean ** 7
+    g = 0.5 * (1 - numpy.sqrt (cmean7 / (cmean7 + 25.0 ** 7)))
+
+    a1 = a1 * (1 + g)
+    a2 = a2 * (1 + g)
+    c1 = numpy.hypot (a1, b1)
+    c2 = numpy.hypot (a2, b2)
+    h1 = numpy.arctan2 (b1, a1) % (2 * numpy.pi)
+    h2 = numpy.arctan2 (b2, a2) % (2 * numpy.pi)
+
+    dl = l2 - l1
+    dc = c2 - c1
+
+    # Hue difference, wrapped to (-pi, pi] and 0 for neutral colors
+    dh = h2 - h1
+    dh = numpy.where (dh > numpy.pi, dh - 2 * numpy.pi, numpy.where (dh < -numpy.pi, dh + 2 * numpy.pi, dh))
+    chroma = c1 * c2
+    dh = numpy.where (chroma == 0, 0, dh)
+    dhh = 2 * numpy.sqrt (chroma) * numpy.sin (dh / 2)
+
+    lmean = (l1 + l2) / 2
+    cmean = (c1 + c2) / 2
+
+    # Mean hue, taking the short way round the circle
+    hmean = h1 + h2
+    hmean = numpy.where (numpy.abs (h1 - h2) > numpy.pi,
+                         numpy.where (hmean < 2 * numpy.pi, hmean + 2 * numpy.pi, hmean - 2 * numpy.pi),
+                         hmean) / 2
+    hmean = numpy.where (chroma == 0, h1 + h2, hmean)
+
+    t = (1 - 0.17 * numpy.cos (hmean - numpy.radians (30))
+           + 0.24 * numpy.cos (2 * hmean)
+           + 0.32 * numpy.cos (3 * hmean + numpy.radians (6))
+           - 0.20 * numpy.cos (4 * hmean - numpy.radians (63)))
+
+    lmean2 = (lmean - 50) ** 2
+    sl = 1 + 0.015 * lmean2 / numpy.sqrt (20 + lmean2)
+    sc = 1 + 0.045 * cmean
+    sh = 1 + 0.015 * cmean * t
+
+    cmean7 = cmean ** 7
+    rt = (-2 * numpy.sqrt (cmean7 / (cmean7 + 25.0 ** 7))
+          * numpy.sin (numpy.radians (60) * numpy.exp (-((numpy.degrees (hmean) - 275) / 25) ** 2)))
+
+    dl = dl / sl
+    dc = dc / sc
+    dhh = dhh / sh
+
+    return dl ** 2 + dc ** 2 + dhh ** 2 + rt * dc * dhh
@@ -0,0 +1,166 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy
+
+class Command:
+
+    # A batch of cell changes that is undone and redone as a whole. cells
+    # holds flat cell indices, old and new the color indices before and
+    # after the change.
+
+    def __init__ (self, cells, old, new):
+
+        self.cells = numpy.asarray (cells, dtype=numpy.int32)
+        self.old = numpy.asarray (old, dtype=numpy.uint16)
+        self.new = numpy.asarray (new, dtype=numpy.uint16)
+
+    def __len__ (self):
+
+        return len(self.cells)
+
+class Stroke:
+
+    # Collects the cells changed by a mouse drag, to be turned into a
+    # single command once the button is released
+
+    def __init__ (self):
+
+        self._cells = []
+        self._old = []
+        self._new = []
+
+    def add_cells (self, cells, old, new):
+
+        self._cells.extend (cells)
+        self._old.extend (old)
+        self._new.extend (new)
+
+    def get_command (self):
+
+        # A cell may have been painted several times along the stroke. Keep
+        # its value before the first change and after the last one, and
+        # drop the cells that ended up as they were.
+        cells = numpy.array (self._cells, dtype=numpy.int32)
+        old = numpy.array (self._old, dtype=numpy.uint16)
+        new = numpy.array (self._new, dtype=numpy.uint16)
+
+        unique, first = numpy.unique (cells, return_index=True)
+        _, last = numpy.unique (cells[::-1], return_index=True)
+        last = len(cells) - 1 - last
+
+        old = old[first]
+        new = new[last]
+        changed = old != new
+
+        if not changed.any ():
+            return None
+
+        return Command (unique[changed], old[changed], new[changed])
+
+class CommandLog:
+
+    # Undo and redo history, kept in a ring buffer. The oldest commands
+    # are dropped when there are more than max_commands, or when together
+    # they hold more than max_entries cell changes.
+
+    def __init__ (self, max_commands = 100, max_entries = 1 << 20):
+
+        self._max_commands = max_commands
+        self._max_entries = max_entries
+
+        self._commands = [None] * max_commands
+        self._start = 0
+        self._count = 0
+        self._position = 0
+        self._entries = 0
+
+    def push (self, command):
+
+        # Commands that were undone can not be redone any more
+        while self._count > self._position:
+            self._count -= 1
+            self._entries -= len(self._slot (self._count))
+            self._commands[(self._start + self._count) % self._max_commands] = None
+
+        if self._count == self._max_commands:
+            self._drop_oldest ()
+
+        self._commands[(self._start + self._count) % self._max_commands] = command
+        self._count += 1
+        self._position = self._count
+        self._entries += len(command)
+
+        while self._entries > self._max_entries and self._count > 1:
+            self._drop_oldest ()
+
+    def undo (self):
+
+        # Returns the command to undo, or None
+        if self._position == 0:
+            return None
+
+        self._position -= 1
+        return self._slot (self._position)
+
+    def redo (self):
+
+        # Returns the command to redo, or None
+        if self._position == self._count:
+            return None
+
+        self._position += 1
+        return self._slot (self._position - 1)
+
+    def get_history (self):
+
+        # Stored commands, oldest first, and the number of them applied
+        return ([self._slot (i) for i in range (self._count)], self._position)
+
+    def set_history (self, commands, position):
+
+        self.clear ()
+        for command in commands:
+            self.push (command)
+
+        # Some of the oldest commands may not have fit
+        dropped = len(commands) - self._count
+        self._position = max (position - dropped, 0)
+
+    def clear (self):
+
+        self._commands = [None] * self._max_commands
+        self._start = 0
+        self._count = 0
+        self._position = 0
+        self._entries = 0
+
+    def _slot (self, i):
+
+        return self._commands[(self._start + i) % self._max_commands]
+
+    def _drop_oldest (self):
+
+        self._entries -= len(self._commands[self._start])
+        self._commands[self._start] = None
+        self._start = (self._start + 1) % self._max_commands
+        self._count -= 1
+        self._position = max (self._position - 1, 0)
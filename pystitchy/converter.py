@@ -0,0 +1,127 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy
+from dither import dither, dither_rows
+from color_matcher import MatcherCache
+from palette_reducer import PaletteReducer
+from tools import remove_confetti
+
+try:
+    from PIL import Image
+except ImportError:
+    # Only needed to load images without wx
+    Image = None
+
+def get_scaled_size (width, height, xcells, ycells):
+
+    # Size of an image scaled to fit in a grid of xcells x ycells, keeping
+    # its aspect ratio
+    scale = min (float(xcells) / width, float(ycells) / height)
+
+    return (max (1, int(round(width * scale))), max (1, int(round(height * scale))))
+
+def load_image (path, xcells, ycells):
+
+    # Loads and scales an image without wx, from a path or a file object.
+    # Returns its pixels, with shape (height, width, 3), and its alpha
+    # channel or None.
+    if Image is None:
+        raise ImportError ('PIL is needed to load images without wx')
+
+    image = Image.open (path)
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    image = image.convert ('RGBA' if has_alpha else 'RGB')
+
+    # Nearest neighbour, like the wx.Image scaling used by ImageImporter
+    size = get_scaled_size (image.size[0], image.size[1], xcells, ycells)
+    image = image.resize (size, Image.NEAREST)
+
+    data = numpy.asarray (image, dtype=numpy.uint8)
+    if has_alpha:
+        return (data[:,:,:3], data[:,:,3])
+
+    return (data, None)
+
+def convert_pixels (matcher, pixels, alpha = None, mode = None):
+
+    # Pattern for an image, with the index in the matcher palette plus one
+    # for every stitch and 0 for the transparent pixels, which are left
+    # empty. mode is one of the dithering modes in dither.DITHER_MODES.
+    pattern = dither (matcher, pixels, mode).astype (numpy.uint16) + 1
+
+    if alpha is not None:
+        pattern[alpha == 0] = 0
+
+    return pattern
+
+def convert_rows (matcher, pixels, alpha = None, mode = None, rows = 16):
+
+    # Like convert_pixels, but yields (y0, pattern) for batches of rows as
+    # soon as they are matched
+    for y0, indices in dither_rows (matcher, pixels, mode, rows):
+        pattern = indices.astype (numpy.uint16) + 1
+
+        if alpha is not None:
+            pattern[alpha[y0:y0+len(pattern)] == 0] = 0
+
+        yield (y0, pattern)
+
+# Set in every worker process by init_worker, for convert_image
+_palette = None
+_matchers = None
+_reducer = None
+
+def init_worker (palette):
+
+    # Initializer of the worker processes that convert images, palette
+    # being a dict dmc -> (code, name) with all the colors to match to
+    global _palette, _matchers, _reducer
+
+    _palette = palette
+    _matchers = MatcherCache ()
+    _reducer = PaletteReducer (palette)
+
+def convert_image (source, xcells, ycells, codes = None, metric = 'redmean', mode = None,
+                   ncolors = None, confetti = None):
+
+    # Whole conversion of an image, from a path or a file object, in a
+    # process set up by init_worker. codes limits the palette to some of
+    # its DMC codes, ncolors to the colors that best represent the image,
+    # and confetti is the size of the smallest regions that are kept.
+    # Returns the pattern, its matcher and the palette it was matched to.
+    pixels, alpha = load_image (source, xcells, ycells)
+
+    palette = _palette
+    reducer = _reducer
+    if codes:
+        palette = dict ([(dmc, _palette[dmc]) for dmc in codes])
+        reducer = PaletteReducer (palette)
+    if ncolors:
+        # Only the colors that best represent this image
+        palette = dict ([(dmc, palette[dmc]) for dmc in reducer.reduce (pixels, ncolors)])
+    matcher = _matchers.get (palette, metric)
+
+    pattern = convert_pixels (matcher, pixels, alpha, mode)
+    if confetti:
+        pattern = remove_confetti (pattern, confetti)
+
+    return (pattern, matcher, palette)
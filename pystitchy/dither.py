@@ -0,0 +1,128 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy
+
+# Error diffusion kernels, as (dx, dy, weight) for the neighbours that
+# receive part of the error of a pixel
+KERNELS = {
+    'floyd-steinberg': ((1, 0, 7/16.0), (-1, 1, 3/16.0), (0, 1, 5/16.0), (1, 1, 1/16.0)),
+    'atkinson': ((1, 0, 1/8.0), (2, 0, 1/8.0), (-1, 1, 1/8.0), (0, 1, 1/8.0), (1, 1, 1/8.0), (0, 2, 1/8.0)),
+}
+
+DITHER_MODES = ('none', 'floyd-steinberg', 'atkinson', 'ordered')
+
+def dither (matcher, pixels, mode):
+
+    # Palette indices for an image, with shape (height, width), using one
+    # of DITHER_MODES
+    if mode == 'ordered':
+        return ordered_dither (matcher, pixels)
+    elif mode in KERNELS:
+        return diffuse_error (matcher, pixels, KERNELS[mode])
+    elif mode in (None, 'none'):
+        return matcher.match (pixels)
+
+    raise ValueError ('Unknown dithering mode %s' % mode)
+
+def dither_rows (matcher, pixels, mode, rows = 16):
+
+    # Like dither, but yields (y0, indices) for batches of rows as soon as
+    # they are done, so callers can show progress or stop early
+    if mode in KERNELS:
+        for batch in _diffuse_rows (matcher, pixels, KERNELS[mode], rows):
+            yield batch
+        return
+
+    if mode not in ('ordered', 'none', None):
+        raise ValueError ('Unknown dithering mode %s' % mode)
+
+    for y0 in range (0, len(pixels), rows):
+        if mode == 'ordered':
+            yield (y0, ordered_dither (matcher, pixels[y0:y0+rows], y0=y0))
+        else:
+            yield (y0, matcher.match (pixels[y0:y0+rows]))
+
+def bayer_matrix (size):
+
+    # Threshold map of size x size, size being a power of two, with values
+    # evenly spread in (-0.5, 0.5)
+    m = numpy.zeros ((1, 1))
+    while len(m) < size:
+        m = numpy.vstack ((numpy.hstack ((4*m, 4*m + 2)),
+                           numpy.hstack ((4*m + 3, 4*m + 1))))
+
+    return (m + 0.5) / m.size - 0.5
+
+def ordered_dither (matcher, pixels, size = 4, y0 = 0):
+
+    # The threshold map is added to the whole image at once, scaled to the
+    # typical distance between palette colors. y0 is the row of the image
+    # where pixels start, when dithering it in parts.
+    height, width = pixels.shape[:2]
+    offset = y0 % size
+
+    spread = 255.0 / max (len(matcher.get_rgb ()) ** (1/3.0) - 1, 1)
+    thresholds = numpy.tile (bayer_matrix (size), (height // size + 2, width // size + 1))
+    thresholds = thresholds[offset:offset+height, :width, numpy.newaxis] * spread
+
+    dithered = numpy.clip (pixels + thresholds, 0, 255)
+
+    return matcher.match (numpy.rint (dithered).astype (numpy.uint8))
+
+def diffuse_error (matcher, pixels, kernel):
+
+    return numpy.concatenate ([indices for y0, indices in _diffuse_rows (matcher, pixels, kernel, len(pixels))])
+
+def _diffuse_rows (matcher, pixels, kernel, rows):
+
+    # Error diffusion, processing the image in wavefronts: the pixels on a
+    # line x + 2*y = t only take error from pixels on earlier lines, for
+    # the kernels above, so each line is matched as a single batch. The
+    # result is the same as going through the pixels one by one. Row y is
+    # finished after line width - 1 + 2*y, and finished rows are yielded
+    # in batches.
+    height, width = pixels.shape[:2]
+    rgb = matcher.get_rgb ().astype (numpy.float32)
+
+    pad = max (max (abs(dx), dy) for dx, dy, w in kernel)
+    work = numpy.zeros ((height + pad, width + 2*pad, 3), dtype=numpy.float32)
+    work[:height, pad:pad+width] = pixels
+
+    indices = numpy.empty ((height, width), dtype=numpy.intp)
+    done = 0
+
+    for t in range (width + 2*(height - 1)):
+        ys = numpy.arange (max (0, (t - width + 2) // 2), min (height - 1, t // 2) + 1)
+        xs = t - 2*ys
+
+        values = numpy.clip (work[ys, xs + pad], 0, 255)
+        matched = matcher.match (numpy.rint (values).astype (numpy.uint8))
+        indices[ys, xs] = matched
+
+        error = values - rgb[matched]
+        for dx, dy, w in kernel:
+            work[ys + dy, xs + pad + dx] += error * w
+
+        finished = max (0, (t - width + 1) // 2 + 1)
+        if finished - done >= rows or finished == height:
+            yield (done, indices[done:finished].copy ())
+            done = finished
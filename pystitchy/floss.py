@@ -0,0 +1,68 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import math
+
+# Fabric counts, in stitches per inch, shown in the usage report
+FABRIC_COUNTS = (11, 14, 16, 18)
+
+# A skein of stranded cotton is 8 m of 6 strands
+SKEIN_LENGTH = 800.0
+SKEIN_STRANDS = 6
+
+# Extra thread for the tails and for moving between stitches
+WASTE = 1.2
+
+def stitches_per_skein (fabric_count, strands = 2):
+
+    # A full cross is two diagonals on the front and, on average, two
+    # sides of the cell on the back
+    side = 2.54 / fabric_count
+    per_stitch = (2 * math.sqrt (2) + 2) * side * WASTE
+
+    return SKEIN_LENGTH * (SKEIN_STRANDS // strands) / per_stitch
+
+def skeins (stitches, fabric_count, strands = 2):
+
+    return stitches / stitches_per_skein (fabric_count, strands)
+
+def usage_report (usage, fabric_counts = FABRIC_COUNTS, strands = 2):
+
+    # Text table of the stitches and skeins of every color. usage is a
+    # list of (name, stitches), in the order they are shown. The total
+    # line rounds every color up to whole skeins, as they are bought.
+    header = '%-40s %9s' % ('Color', 'Stitches')
+    header += ''.join ([' %8s' % ('%d ct' % count) for count in fabric_counts])
+    lines = [header, '-' * len(header)]
+
+    bought = [0] * len(fabric_counts)
+    for name, stitches in usage:
+        needed = [skeins (stitches, count, strands) for count in fabric_counts]
+        lines.append ('%-40s %9d' % (name[:40], stitches) + ''.join ([' %8.2f' % n for n in needed]))
+        bought = [b + int(math.ceil (n)) for b, n in zip (bought, needed)]
+
+    lines.append ('-' * len(header))
+    lines.append ('%-40s %9d' % ('%d colors, skeins to buy' % len(usage), sum ([s for n, s in usage])) +
+                  ''.join ([' %8d' % b for b in bought]))
+    lines.append ('')
+    lines.append ('Skeins of 8 m, stitching with %d strands' % strands)
+
+    return '\n'.join (lines)
@@ -21,144 +21,171 @@
 
 import wx
 import numpy
-from numpy import zeros
+from pattern import Pattern
+from grid_shapes import grid_lines, cell_rects
+from profiler import profiler, timed
 
 class Grid:
+
+    # View of a Pattern, drawing it on a wx.DC and converting between
+    # cells and mouse positions
     
-    def __init__ (self):
+    def __init__ (self, pattern = None):
 
-        self._xcells = 120
-        self._ycells = 80
+        if pattern is None:
+            pattern = Pattern ()
+        self._pattern = pattern
+        self._xcells, self._ycells = pattern.get_dimensions ()
 
-        self._xsize = 1200
-        self._ysize = 800
-        self._xoffset = self._xsize / self._xcells * 5
+        # Size of a cell in pixels
+        self._step = 10
+        self._min_step = 2
+        self._xoffset = self._step * 5
         self._yoffset = self._xoffset
 
 
-        self._zoom_factor = 100
-
-        self._init_matrix ()
+        self._zoom_factor = 1
 
-    def _init_matrix (self):
-        
-        self._cells = zeros ((self._xcells, self._ycells), dtype=numpy.bool)
-        self._colors = {}
+        # Drawing objects, cached by color index and zoom level
+        self._pens = {}
+        self._line_pen = wx.Pen (wx.LIGHT_GREY, 1)
+        self._bold_line_pen = wx.Pen (wx.BLACK, 1)
+        self._line_positions = {}
 
-        for x in range (self._xcells):
-            for y in range (self._ycells):
-                self._colors[(x,y)] = []
-        
     def decrease_zoom (self):
 
-        self._xsize = self._xsize - self._zoom_factor
-        self._ysize = self._ysize - self._zoom_factor
+        self._step = max (self._step - self._zoom_factor, self._min_step)
 
-        self._xoffset = self._xsize / self._xcells * 5
+        self._xoffset = self._step * 5
         self._yoffset = self._xoffset
         
     def increase_zoom (self):
 
-        self._xsize = self._xsize + self._zoom_factor
-        self._ysize = self._ysize + self._zoom_factor
+        self._step = self._step + self._zoom_factor
 
-        self._xoffset = self._xsize / self._xcells * 5
+        self._xoffset = self._step * 5
         self._yoffset = self._xoffset
         
     def get_size (self):
 
-        return (self._xsize + self._xoffset, self._ysize + self._yoffset)
+        return (self._xcells * self._step + 2 * self._xoffset,
+                self._ycells * self._step + 2 * self._yoffset)
     
-    def draw_grid(self, dc):
-
-        step = self._xsize / self._xcells
-        boldstep = step * 10
-
-        # Vertical lines
-        dc.SetPen (wx.Pen(wx.LIGHT_GREY, 1))
-        for x in range(self._xcells+1):
-            xsize = x*step
-            ysize = step * self._ycells
-            dc.DrawLine(self._xoffset + xsize, self._yoffset, xsize + self._xoffset, ysize + self._yoffset)
-
-        # Draw bold lines
-        dc.SetPen (wx.Pen(wx.BLACK,1))
-        for x in range((self._xcells)/10+1):
-            xsize = x*boldstep
-            ysize = step * self._ycells
-            dc.DrawLine(xsize + self._xoffset, self._yoffset, xsize + self._xoffset, ysize + self._yoffset)
-
-            
-        # Horizontal lines
-        dc.SetPen (wx.Pen(wx.LIGHT_GREY, 1))
-
-        for y in range(self._ycells+1):
-            ysize = y*step
-            xsize = self._xcells*step
-            dc.DrawLine(self._xoffset, ysize + self._yoffset, xsize + self._xoffset, ysize + self._yoffset)
-
-        # Draw bold lines
-        dc.SetPen (wx.Pen(wx.BLACK,1))
-        for y in range((self._ycells)/10+1):
-            ysize = y*boldstep
-            xsize = self._xcells*step
-            dc.DrawLine(self._xoffset, ysize + self._yoffset, xsize + self._xoffset, ysize + self._yoffset)
-
-        for x in range(self._xcells):
-            for y in range(self._ycells):
-                
-                if self._cells[x][y]:
-                    self._paint_cell (x, y, dc, self._colors[(x,y)][-1])
-            
-
-    def add_cell (self, xcell, ycell, dc, color, erase):
-
-        if not erase:
-            if xcell >= 0 and ycell >= 0 and xcell < self._xcells and ycell < self._ycells:
-                self._cells[xcell][ycell] = True
-                if not len(self._colors[(xcell,ycell)]):
-                    self._colors[(xcell,ycell)].append(color)
-                elif self._colors[(xcell,ycell)][-1] != color:
-                    self._colors[(xcell,ycell)].append(color)
-                self._paint_cell (xcell, ycell, dc, color)
+    def get_cell_range (self, rect):
+
+        # Cells overlapped by a rectangle in unscrolled coordinates, as
+        # (x0, y0, x1, y1) with x1 and y1 excluded and clipped to the grid
+        step = self._step
+
+        x0 = (rect.GetLeft() - self._xoffset) // step
+        y0 = (rect.GetTop() - self._yoffset) // step
+        x1 = (rect.GetRight() - self._xoffset) // step + 1
+        y1 = (rect.GetBottom() - self._yoffset) // step + 1
+
+        x0 = min (max (x0, 0), self._xcells)
+        y0 = min (max (y0, 0), self._ycells)
+        x1 = min (max (x1, x0), self._xcells)
+        y1 = min (max (y1, y0), self._ycells)
+
+        return (x0, y0, x1, y1)
+
+    def get_range_rect (self, x0, y0, x1, y1):
+
+        # Rectangle covered by a range of cells in unscrolled coordinates,
+        # including the lines around it
+        step = self._step
+        px, py = self.cell2mouse (x0, y0)
+
+        return wx.Rect (px, py, (x1 - x0)*step + 1, (y1 - y0)*step + 1)
+
+    def get_cell_rect (self, xcell, ycell):
+
+        return self.get_range_rect (xcell, ycell, xcell + 1, ycell + 1)
+
+    @timed ('draw_grid')
+    def draw_grid(self, dc, rects = None):
+
+        # Only the parts of the grid overlapping rects are drawn, rects
+        # being in unscrolled coordinates. The whole grid is drawn if no
+        # rects are given.
+        if rects is None:
+            ranges = [(0, 0, self._xcells, self._ycells)]
         else:
-            if xcell >= 0 and ycell >= 0 and xcell < self._xcells and ycell < self._ycells:
-                self._cells[xcell][ycell] = False
-                if not len(self._colors[(xcell,ycell)]):
-                    self._colors[(xcell,ycell)].append(None)
-                elif self._colors[(xcell,ycell)][-1]:
-                    self._colors[(xcell,ycell)].append(None)
-                self._paint_cell (xcell, ycell, dc, None, erase)
-                
-        return len(self._colors[(xcell,ycell)])-1
+            ranges = [self.get_cell_range (r) for r in rects]
 
-    def get_color_by_mouse (self, x, y):
-        
-        step = self._xsize / self._xcells
-        
-        xcell = int((x - self._xoffset)/step)
-        ycell = int((y - self._yoffset)/step)
+        for x0, y0, x1, y1 in ranges:
+            self._draw_range (dc, x0, y0, x1, y1)
+
+    def _get_line_positions (self):
+
+        # Positions of the vertical and horizontal lines, computed once per
+        # zoom level
+        step = self._step
 
         try:
-            c = self._colors[(xcell, ycell)][-1]
-            if c:
-                # Return a copy of the color, otherwise two consecutive colors in the same
-                # cell would have the same colour, due to Python's pass by reference
-                r, g, b = c.Get()
-                return wx.Colour(r, g, b)
-            else:
-                return c
+            return self._line_positions[step]
         except KeyError:
-            return None
-        except IndexError:
+            xs = numpy.arange (self._xcells + 1) * step + self._xoffset
+            ys = numpy.arange (self._ycells + 1) * step + self._yoffset
+            self._line_positions[step] = (xs, ys)
+            return (xs, ys)
+
+    def _get_pen_and_brush (self, index):
+
+        try:
+            return self._pens[index]
+        except KeyError:
+            color = wx.Colour (*self._pattern.get_color (index))
+            self._pens[index] = (wx.Pen (color), wx.Brush (color))
+            return self._pens[index]
+
+    def _draw_range (self, dc, x0, y0, x1, y1):
+
+        xs, ys = self._get_line_positions ()
+
+        # Normal lines, and then bold lines on top of them
+        for pen, lines in zip ((self._line_pen, self._bold_line_pen), grid_lines (xs, ys, x0, y0, x1, y1)):
+            if len(lines):
+                dc.SetPen (pen)
+                dc.DrawLineList (lines.tolist())
+                profiler.count ('draw_calls')
+                profiler.count ('draw_lines', len(lines))
+
+        cells = self._pattern.read (x0, y0, x1, y1)
+        for index, rects in cell_rects (cells, xs, ys, x0, y0, self._step):
+            pen, brush = self._get_pen_and_brush (index)
+            dc.SetPen (pen)
+            dc.SetBrush (brush)
+            dc.DrawRectangleList (rects.tolist())
+            profiler.count ('draw_calls')
+            profiler.count ('draw_rectangles', len(rects))
+
+    def add_cell (self, xcell, ycell, color, erase):
+
+        # Cells are not painted here, the caller must refresh the area
+        # given by get_cell_rect. Returns the color indices of the cell
+        # before and after the change, or None if it is out of the grid.
+        if erase:
+            return self._pattern.set_cell (xcell, ycell, None)
+
+        return self._pattern.set_cell (xcell, ycell, color.Get())
+
+    def get_color_by_mouse (self, x, y):
+        
+        xcell, ycell = self.mouse2cell (x, y)
+
+        if not self._pattern.in_grid (xcell, ycell):
             return None
 
-    def get_color_by_index (self, xcell, ycell, i):
-        return self._colors[(xcell,ycell)][i]
+        rgb = self._pattern.get_color (self._pattern.get_cell (xcell, ycell))
+        if rgb:
+            return wx.Colour(*rgb)
+        else:
+            return None
 
     def mouse2cell (self, mousex, mousey):
 
-        step = self._xsize / self._xcells
+        step = self._step
         
         xcell = int((mousex - self._xoffset)/step)
         ycell = int((mousey - self._yoffset)/step)
@@ -167,7 +194,7 @@ class Grid:
 
     def cell2mouse (self, xcell, ycell):
 
-        step = self._xsize / self._xcells
+        step = self._step
 
         mousex = int(xcell*step + self._xoffset)
         mousey = int(ycell*step + self._yoffset)
@@ -175,18 +202,3 @@ class Grid:
         return (mousex, mousey)
         
         
-    def _paint_cell (self, xcell, ycell, dc, color, erase = False):
-
-        step = self._xsize / self._xcells
-
-        px = xcell * step + self._xoffset
-        py = ycell * step + self._yoffset
-
-        if not erase:
-            dc.SetPen (wx.Pen(color))
-            dc.SetBrush (wx.Brush (color))
-        else:
-            dc.SetPen (wx.WHITE_PEN)
-            dc.SetBrush (wx.WHITE_BRUSH)
-
-        dc.DrawRectangle(px + 1,py + 1,step - 1,step - 1)
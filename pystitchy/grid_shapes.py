@@ -0,0 +1,80 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy
+
+# Shapes drawn by Grid, built without wx so they can be tested and
+# timed on their own. xs and ys are the pixel positions of the vertical
+# and horizontal lines of the grid, and a range of cells goes from
+# (x0, y0) to (x1, y1), excluded.
+
+def grid_lines (xs, ys, x0, y0, x1, y1):
+
+    # Normal lines around the cells of a range, and then the bold lines
+    # every 10 cells, as (n, 4) arrays of line ends
+    top = ys[y0]
+    bottom = ys[y1]
+    left = xs[x0]
+    right = xs[x1]
+
+    vertical = numpy.arange (x0, x1+1)
+    horizontal = numpy.arange (y0, y1+1)
+
+    result = []
+    for xlines, ylines in ((vertical, horizontal),
+                           (vertical[vertical % 10 == 0], horizontal[horizontal % 10 == 0])):
+        lines = numpy.empty ((len(xlines) + len(ylines), 4), dtype=numpy.int64)
+        lines[:len(xlines), 0] = xs[xlines]
+        lines[:len(xlines), 1] = top
+        lines[:len(xlines), 2] = xs[xlines]
+        lines[:len(xlines), 3] = bottom
+        lines[len(xlines):, 0] = left
+        lines[len(xlines):, 1] = ys[ylines]
+        lines[len(xlines):, 2] = right
+        lines[len(xlines):, 3] = ys[ylines]
+        result.append (lines)
+
+    return result
+
+def cell_rects (cells, xs, ys, x0, y0, step):
+
+    # Filled cells of a range, grouped by color so every color takes a
+    # single call, as a list of (color index, (n, 4) array of rectangles).
+    # cells holds the color indices of the range, indexed [x - x0, y - y0].
+    filled = numpy.argwhere (cells)
+    if not len(filled):
+        return []
+
+    indices = cells[filled[:,0], filled[:,1]]
+    order = indices.argsort (kind='mergesort')
+    filled = filled[order]
+    indices = indices[order]
+
+    rects = numpy.empty ((len(filled), 4), dtype=numpy.int64)
+    rects[:,0] = xs[filled[:,0] + x0] + 1
+    rects[:,1] = ys[filled[:,1] + y0] + 1
+    rects[:,2] = step - 1
+    rects[:,3] = step - 1
+
+    colors, starts = numpy.unique (indices, return_index=True)
+    ends = numpy.append (starts[1:], len(indices))
+
+    return [(index, rects[start:end]) for index, start, end in zip (colors.tolist(), starts.tolist(), ends.tolist())]
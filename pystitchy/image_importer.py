@@ -20,6 +20,8 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 import wx
+import numpy
+from converter import get_scaled_size
 
 class ImageImporter:
 
@@ -33,17 +35,13 @@ class ImageImporter:
 
         self._image = wx.Image (path)
 
-    def scale_image (self):
+    def scale_image (self, xcells = 120, ycells = 80):
 
         height = self._image.GetHeight ()
         width = self._image.GetWidth ()
 
-        ratio = width / height
-
-        if width > height:
-            self._image.Rescale (120,80/ratio)
-        else:
-            self._image.Rescale (ratio*80,80)
+        width, height = get_scaled_size (width, height, xcells, ycells)
+        self._image.Rescale (width, height)
 
     def get_size (self):
 
@@ -58,3 +56,31 @@ class ImageImporter:
         blue = self._image.GetBlue (x,y)
 
         return wx.Colour (red, green, blue)
+
+    def get_pixels (self):
+
+        # Array of shape (height, width, 3) viewing the image RGB data
+        # directly, no copies are made. It is only valid until the image is
+        # modified (e.g. rescaled), so get it after scale_image.
+        height, width = self.get_size ()
+        data = numpy.frombuffer (self._image.GetDataBuffer (), dtype=numpy.uint8)
+
+        return data.reshape ((height, width, 3))
+
+    def get_alpha (self):
+
+        # Array of shape (height, width) with the opacity of every pixel, or
+        # None if the image is fully opaque
+        height, width = self.get_size ()
+
+        if self._image.HasAlpha ():
+            data = numpy.frombuffer (self._image.GetAlphaBuffer (), dtype=numpy.uint8)
+            return data.reshape ((height, width))
+        elif self._image.HasMask ():
+            mask = (self._image.GetMaskRed (),
+                    self._image.GetMaskGreen (),
+                    self._image.GetMaskBlue ())
+            transparent = (self.get_pixels () == mask).all (axis=2)
+            return numpy.where (transparent, 0, 255).astype (numpy.uint8)
+
+        return None
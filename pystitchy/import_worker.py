@@ -0,0 +1,63 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import threading
+from converter import convert_rows
+from profiler import timed
+
+class ImportWorker (threading.Thread):
+
+    # Converts an image to a pattern in a background thread. on_rows is
+    # called with (y0, pattern) for every batch of rows, and on_done with
+    # whether the import was cancelled and the error that stopped it, or
+    # None. Both are called from the worker thread.
+
+    def __init__ (self, matcher, pixels, alpha, mode, on_rows, on_done, rows = 16):
+
+        threading.Thread.__init__ (self)
+        self.daemon = True
+
+        self._matcher = matcher
+        self._pixels = pixels
+        self._alpha = alpha
+        self._mode = mode
+        self._rows = rows
+        self._on_rows = on_rows
+        self._on_done = on_done
+        self._cancelled = threading.Event ()
+
+    def cancel (self):
+
+        self._cancelled.set ()
+
+    @timed ('import_image')
+    def run (self):
+
+        error = None
+        try:
+            for y0, pattern in convert_rows (self._matcher, self._pixels, self._alpha, self._mode, self._rows):
+                if self._cancelled.is_set ():
+                    break
+                self._on_rows (y0, pattern)
+        except Exception as e:
+            error = str(e)
+
+        self._on_done (self._cancelled.is_set (), error)
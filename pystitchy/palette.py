@@ -0,0 +1,108 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import marshal
+import os
+import sys
+
+def _parse_colors (path):
+
+    f = open(path, 'r')
+    ls = f.readlines()
+    f.close()
+
+    dmcs = []
+    names = []
+    codes = []
+    for l in ls:
+        dmc, name, code = l.split(',')
+        dmcs.append (dmc)
+        names.append (name)
+        codes.append (code)
+
+    return (dmcs, names, codes)
+
+def load_palette (path):
+
+    # Returns the colors of a colors file, which has a dmc,name,code line
+    # per color, as a list of DMC codes in file order and a dict
+    # dmc -> (code, name). A compiled copy is kept next to the file, and
+    # used until the file changes.
+    cache_path = path + '.cache'
+    stat = os.stat (path)
+    key = (stat.st_mtime, stat.st_size, tuple(sys.version_info[:2]))
+
+    entries = None
+    try:
+        f = open(cache_path, 'rb')
+        try:
+            cached_key, cached_entries = marshal.load (f)
+        finally:
+            f.close()
+        if tuple(cached_key) == key:
+            entries = cached_entries
+    except Exception:
+        # Missing or unreadable cache, parse the file again
+        pass
+
+    if entries is None:
+        entries = _parse_colors (path)
+        try:
+            f = open(cache_path, 'wb')
+            try:
+                marshal.dump ((key, entries), f)
+            finally:
+                f.close()
+        except (IOError, OSError):
+            # Not being able to write the cache only makes the next start slower
+            pass
+
+    dmcs, names, codes = entries
+
+    return (list(dmcs), dict (zip (dmcs, zip (codes, names))))
+
+def load_colors (path):
+
+    # Returns a dict dmc -> (code, name) with the colors of a colors file
+    return load_palette (path)[1]
+
+def select_palette (colors, codes):
+
+    # Subset of colors given a comma separated list of DMC codes, or a file
+    # with the codes. Raises KeyError for unknown codes.
+    if not codes:
+        return colors
+
+    if os.path.isfile (codes):
+        f = open(codes, 'r')
+        codes = f.read().replace('\n', ',')
+        f.close()
+
+    palette = {}
+    for dmc in codes.split(','):
+        dmc = dmc.strip()
+        if not dmc:
+            continue
+        if dmc not in colors:
+            raise KeyError (dmc)
+        palette[dmc] = colors[dmc]
+
+    return palette
@@ -0,0 +1,161 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import numpy
+from collections import OrderedDict
+from color_matcher import ColorMatcher
+
+# Channel weights for clustering, roughly those of the redmean distance
+# used to match colors
+WEIGHTS = numpy.array ([2.0, 4.0, 3.0])
+
+def sample_colors (pixels, max_samples = 1 << 16, seed = 0):
+
+    # Distinct colors of an image, with shape (n, 3), and how many times
+    # each one appears. Big images are sampled first, so the work does not
+    # depend on the image size.
+    flat = numpy.asarray (pixels).reshape (-1, 3)
+    if len(flat) > max_samples:
+        flat = flat[numpy.random.RandomState (seed).randint (0, len(flat), max_samples)]
+
+    flat = flat.astype (numpy.uint32)
+    packed = (flat[:,0] << 16) | (flat[:,1] << 8) | flat[:,2]
+    keys, counts = numpy.unique (packed, return_counts=True)
+
+    colors = numpy.column_stack ((keys >> 16, (keys >> 8) & 0xff, keys & 0xff))
+
+    return (colors.astype (numpy.float64), counts.astype (numpy.float64))
+
+def median_cut (colors, counts, n):
+
+    # Splits a color box along its widest channel at the weighted median
+    # until there are n boxes. Returns the weighted mean of every box.
+    boxes = [numpy.arange (len(colors))]
+
+    while len(boxes) < n:
+        best = None
+        for i, box in enumerate (boxes):
+            if len(box) < 2:
+                continue
+            # Boxes with many pixels are split first
+            spread = (colors[box].max (axis=0) - colors[box].min (axis=0)) * WEIGHTS
+            score = spread.max () * counts[box].sum ()
+            if best is None or score > best[0]:
+                best = (score, i, spread.argmax ())
+
+        if best is None:
+            # Fewer colors than boxes
+            break
+
+        _score, i, channel = best
+        box = boxes.pop (i)
+        box = box[colors[box, channel].argsort (kind='mergesort')]
+        weight = counts[box].cumsum ()
+        split = min (max (weight.searchsorted (weight[-1] / 2.0), 1), len(box) - 1)
+        boxes.extend ([box[:split], box[split:]])
+
+    return numpy.array ([numpy.average (colors[box], axis=0, weights=counts[box]) for box in boxes])
+
+def nearest (points, centers, chunk_size = 4096):
+
+    # Index of the closest center for every point, in chunks so the
+    # points x centers distance matrix stays small
+    labels = numpy.empty (len(points), dtype=numpy.intp)
+
+    for start in range (0, len(points), chunk_size):
+        chunk = points[start:start+chunk_size, numpy.newaxis, :]
+        labels[start:start+len(chunk)] = ((chunk - centers) ** 2).sum (axis=2).argmin (axis=1)
+
+    return labels
+
+def kmeans (colors, counts, centers, iterations = 8):
+
+    # Weighted Lloyd iterations, starting from the given centers. Returns
+    # the centers and the weight of every cluster.
+    scale = numpy.sqrt (WEIGHTS)
+    points = colors * scale
+    centers = centers * scale
+
+    for i in range (iterations):
+        labels = nearest (points, centers)
+
+        weights = numpy.bincount (labels, counts, len(centers))
+        used = weights > 0
+
+        # Empty clusters restart from the points worst represented so far
+        empty = numpy.flatnonzero (~used)
+        if len(empty):
+            error = ((points - centers[labels]) ** 2).sum (axis=1) * counts
+            worst = numpy.argsort (-error, kind='mergesort')[:len(empty)]
+            centers[empty[:len(worst)]] = points[worst]
+        for c in range (3):
+            sums = numpy.bincount (labels, counts * points[:,c], len(centers))
+            centers[used, c] = sums[used] / weights[used]
+
+    return (centers / scale, weights)
+
+def snap_to_palette (matcher, centers, weights):
+
+    # Closest palette color for every center, heaviest clusters first and
+    # never using the same color twice
+    distances = matcher.get_distances (numpy.rint (centers))
+    dmcs = matcher.get_dmcs ()
+
+    chosen = []
+    for i in numpy.argsort (-weights, kind='mergesort'):
+        if len(chosen) == len(dmcs):
+            break
+        index = distances[i].argmin ()
+        chosen.append (dmcs[index])
+        distances[:, index] = numpy.inf
+
+    return chosen
+
+
+class PaletteReducer:
+
+    def __init__ (self, palette, size = 16):
+
+        # palette is a dict dmc -> (code, name) with the colors to choose from
+        self._matcher = ColorMatcher (palette)
+        self._size = size
+        self._results = OrderedDict ()
+
+    def reduce (self, pixels, n):
+
+        # The n palette colors that best represent an image, as DMC codes.
+        # Results are kept per image contents and n.
+        pixels = numpy.ascontiguousarray (pixels, dtype=numpy.uint8)
+        key = (hashlib.sha1 (pixels).hexdigest (), pixels.shape, n)
+
+        dmcs = self._results.pop (key, None)
+        if dmcs is None:
+            colors, counts = sample_colors (pixels)
+            centers, weights = kmeans (colors, counts, median_cut (colors, counts, n))
+            dmcs = snap_to_palette (self._matcher, centers, weights)
+
+        self._results[key] = dmcs
+
+        while len(self._results) > self._size:
+            self._results.popitem (last=False)
+
+        return list (dmcs)
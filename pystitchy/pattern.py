@@ -0,0 +1,174 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy
+from chunked_matrix import ChunkedMatrix
+
+class Pattern:
+
+    # The cells of a pattern and their colors, without anything to do with
+    # drawing them. Colors are (r, g, b) tuples.
+
+    def __init__ (self, xcells = 120, ycells = 80):
+
+        self._xcells = xcells
+        self._ycells = ycells
+
+        # Color index of every cell, 0 means an empty cell. Stored in chunks
+        # that are only allocated once something is drawn on them.
+        self._cells = ChunkedMatrix (self._xcells, self._ycells)
+
+        # Colors used in the pattern, indexed by their position. The first
+        # one stands for empty cells.
+        self._color_table = [None]
+        self._color_indices = {}
+
+        # Number of cells of every color index, kept up to date on every
+        # change so it never needs a scan of the whole pattern. Grows with
+        # the color table.
+        self._counts = numpy.zeros (16, dtype=numpy.int64)
+        self._counts[0] = self._xcells * self._ycells
+
+    def get_dimensions (self):
+
+        return (self._xcells, self._ycells)
+
+    def in_grid (self, xcell, ycell):
+
+        return xcell >= 0 and ycell >= 0 and xcell < self._xcells and ycell < self._ycells
+
+    def cell2index (self, xcell, ycell):
+
+        # Flat index of a cell, works with arrays of cells too
+        return xcell * self._ycells + ycell
+
+    def get_color_index (self, rgb):
+
+        try:
+            return self._color_indices[rgb]
+        except KeyError:
+            index = len(self._color_table)
+            self._color_table.append (rgb)
+            self._color_indices[rgb] = index
+            if index >= len(self._counts):
+                self._counts = numpy.concatenate ((self._counts, numpy.zeros_like (self._counts)))
+            return index
+
+    def get_color_indices (self, colors):
+
+        return [self.get_color_index (rgb) for rgb in colors]
+
+    def get_color (self, index):
+
+        # RGB value of a color index, None for empty cells
+        return self._color_table[index]
+
+    def get_color_table (self):
+
+        # RGB values of the colors in the pattern, the first one being
+        # color index 1
+        return self._color_table[1:]
+
+    def get_count (self, index):
+
+        # Number of cells with a color index, 0 gives the empty ones
+        return int(self._counts[index])
+
+    def get_usage (self):
+
+        # (rgb, stitches) for every color in use, most used first
+        counts = self._counts[1:len(self._color_table)]
+        order = numpy.argsort (-counts, kind='mergesort')
+
+        return [(self._color_table[i + 1], int(counts[i])) for i in order if counts[i]]
+
+    def get_plane (self):
+
+        # Dense copy of the color indices of all the cells, indexed [x, y]
+        return self._cells.read (0, 0, self._xcells, self._ycells)
+
+    def set_plane (self, plane):
+
+        self._cells.clear ()
+        self._cells.write (0, 0, plane)
+
+        # A new plane, rather than a change, so it is counted from scratch
+        self._counts[:] = 0
+        counts = numpy.bincount (numpy.ravel (plane))
+        self._counts[:len(counts)] = counts
+
+    def read (self, x0, y0, x1, y1):
+
+        # Dense copy of the color indices of a range of cells, indexed
+        # [x - x0, y - y0]
+        return self._cells.read (x0, y0, x1, y1)
+
+    def get_cell (self, xcell, ycell):
+
+        return self._cells.get (xcell, ycell)
+
+    def set_cell (self, xcell, ycell, rgb):
+
+        # Stitches a cell with a color, or empties it if rgb is None.
+        # Returns the color indices of the cell before and after the
+        # change, or None if it is out of the grid.
+        if not self.in_grid (xcell, ycell):
+            return None
+
+        if rgb is None:
+            index = 0
+        else:
+            index = self.get_color_index (rgb)
+
+        old = self._cells.get (xcell, ycell)
+        self._cells.set (xcell, ycell, index)
+
+        self._counts[old] -= 1
+        self._counts[index] += 1
+
+        return (old, index)
+
+    def get_cells (self, cells):
+
+        # Color indices of an array of flat cell indices
+        return self._cells.get_flat (cells)
+
+    def set_cells (self, cells, values):
+
+        # Set the color indices of an array of flat cell indices, with no
+        # cell repeated. Returns the range of changed cells as
+        # (x0, y0, x1, y1), or None.
+        if not len(cells):
+            return None
+
+        values = numpy.asarray (values)
+        if not values.ndim:
+            values = numpy.repeat (values, len(cells))
+
+        # The counts change by what is replaced and what replaces it
+        size = len(self._counts)
+        self._counts -= numpy.bincount (self._cells.get_flat (cells), minlength=size)
+        self._counts += numpy.bincount (values, minlength=size)
+
+        self._cells.set_flat (cells, values)
+
+        xs, ys = numpy.divmod (cells, self._ycells)
+        return (xs.min(), ys.min(), xs.max() + 1, ys.max() + 1)
@@ -0,0 +1,220 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy
+import os
+import struct
+
+from command_log import Command
+
+TEXT_MAGIC = 'STITCHY-TEXT 1'
+
+# Binary pattern files start with a fixed size header:
+#   magic, version, flags, width, height, number of colors,
+#   offset and size of the index plane, offset and size of the history
+# followed by the color table, with the DMC code and RGB value of every
+# color, the index plane and the optional history. The index plane holds
+# a color index per cell, 0 for empty cells and i+1 for the i-th color,
+# in the [x, y] order used by Grid. It is either stored raw, so it can be
+# memory mapped, or run length encoded.
+MAGIC = 'STITCHYP'
+VERSION = 1
+HEADER = struct.Struct ('<8sHHIIIQQQQ')
+COLOR = struct.Struct ('<16s3Bx')
+
+FLAG_RLE = 1
+FLAG_HISTORY = 2
+
+def _renumber (used, size):
+
+    # Table mapping the color indices in used to 1, 2, ... and 0 to 0
+    table = numpy.zeros (size, dtype=numpy.uint16)
+    table[used] = numpy.arange (1, len(used) + 1)
+
+    return table
+
+def save_text (path, pattern, dmcs, colors):
+
+    # Saves a pattern as text. pattern has shape (height, width), with 0
+    # for empty cells and i+1 for the color dmcs[i], colors being the
+    # dict dmc -> (code, name) of the colors file. Only the colors in use
+    # are written, renumbered from 1.
+    used = numpy.unique (pattern)
+    used = used[used != 0]
+
+    pattern = _renumber (used, len(dmcs) + 1)[pattern]
+
+    height, width = pattern.shape
+
+    f = open(path, 'w')
+    f.write ('%s\n' % TEXT_MAGIC)
+    f.write ('%d %d %d\n' % (width, height, len(used)))
+    for i in used.tolist():
+        dmc = dmcs[i - 1]
+        code, name = colors[dmc]
+        f.write ('%s,%s,%s\n' % (dmc, name, code.strip()))
+    for row in pattern.tolist():
+        f.write (' '.join (map (str, row)) + '\n')
+    f.close()
+
+def save_pattern (path, plane, colors, history = None, compress = None):
+
+    # Saves a pattern in the binary format. plane has shape (width, height)
+    # with 0 for empty cells and i+1 for colors[i], a (dmc, (r, g, b))
+    # tuple. history is an optional (commands, position) tuple, as given
+    # by CommandLog.get_history. The plane is run length encoded if
+    # compress is True, or if it is smaller that way when compress is None.
+    # Colors not in use are dropped, and the rest renumbered from 1.
+    plane = numpy.asarray (plane, dtype=numpy.uint16)
+    width, height = plane.shape
+
+    values = [plane.ravel()]
+    if history:
+        for command in history[0]:
+            values.extend ((command.old, command.new))
+    used = numpy.unique (numpy.concatenate (values))
+    used = used[used != 0]
+
+    table = _renumber (used, len(colors) + 1)
+    flat = table[plane.ravel()]
+
+    # Runs of equal values, as two arrays with their values and lengths
+    starts = numpy.concatenate (([0], numpy.flatnonzero (numpy.diff (flat)) + 1))
+    run_values = flat[starts]
+    run_lengths = numpy.diff (numpy.append (starts, len(flat))).astype (numpy.uint32)
+
+    if compress is None:
+        compress = len(starts) * 6 + 8 < flat.nbytes
+
+    flags = 0
+    if compress:
+        flags |= FLAG_RLE
+        plane_data = [struct.pack ('<Q', len(starts)), run_values.astype ('<u2').tobytes(),
+                      run_lengths.astype ('<u4').tobytes()]
+    else:
+        plane_data = [flat.astype ('<u2').tobytes()]
+
+    history_data = []
+    if history:
+        flags |= FLAG_HISTORY
+        commands, position = history
+        history_data.append (struct.pack ('<II', len(commands), position))
+        for command in commands:
+            history_data.extend ((struct.pack ('<I', len(command)),
+                                  command.cells.astype ('<i4').tobytes(),
+                                  table[command.old].astype ('<u2').tobytes(),
+                                  table[command.new].astype ('<u2').tobytes()))
+
+    plane_offset = HEADER.size + COLOR.size * len(used)
+    plane_size = sum (len(d) for d in plane_data)
+    history_offset = plane_offset + plane_size
+    history_size = sum (len(d) for d in history_data)
+
+    f = open(path, 'wb')
+    f.write (HEADER.pack (MAGIC, VERSION, flags, width, height, len(used),
+                          plane_offset, plane_size, history_offset, history_size))
+    for i in used.tolist():
+        dmc, (r, g, b) = colors[i - 1]
+        f.write (COLOR.pack (dmc, r, g, b))
+    for d in plane_data + history_data:
+        f.write (d)
+    f.close()
+
+def _check (valid, path):
+
+    # Raises the error for a truncated or corrupt pattern file
+    if not valid:
+        raise ValueError ('%s is truncated or corrupt' % path)
+
+def load_pattern (path):
+
+    # Loads a binary pattern file, returning (plane, colors, history) as
+    # taken by save_pattern. history is None if the file has none. Raw
+    # planes are memory mapped, but still read once to check their color
+    # indices. Files that are not patterns, or that are truncated or
+    # corrupt, raise ValueError.
+    f = open(path, 'rb')
+    try:
+        size = os.fstat (f.fileno ()).st_size
+        header = f.read (HEADER.size)
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+            raise ValueError ('%s is not a pattern file' % path)
+
+        (magic, version, flags, width, height, ncolors,
+         plane_offset, plane_size, history_offset, history_size) = HEADER.unpack (header)
+        if version > VERSION:
+            raise ValueError ('%s was saved by a newer version' % path)
+
+        _check (plane_offset >= HEADER.size + COLOR.size * ncolors and
+                plane_offset + plane_size <= size, path)
+        if flags & FLAG_HISTORY:
+            _check (history_offset + history_size <= size, path)
+
+        colors = []
+        for i in range (ncolors):
+            dmc, r, g, b = COLOR.unpack (f.read (COLOR.size))
+            colors.append ((dmc.rstrip ('\0'), (r, g, b)))
+
+        if flags & FLAG_RLE:
+            f.seek (plane_offset)
+            data = f.read (plane_size)
+            _check (len(data) >= 8, path)
+            count, = struct.unpack_from ('<Q', data)
+            _check (len(data) == 8 + 6*count, path)
+            run_values = numpy.frombuffer (data, dtype='<u2', count=count, offset=8)
+            run_lengths = numpy.frombuffer (data, dtype='<u4', count=count, offset=8 + 2*count)
+            _check (run_lengths.sum (dtype=numpy.uint64) == width * height, path)
+            _check (not count or run_values.max () <= ncolors, path)
+            plane = numpy.repeat (run_values, run_lengths).reshape ((width, height))
+        else:
+            _check (plane_size == 2 * width * height, path)
+            plane = numpy.memmap (path, dtype='<u2', mode='r', offset=plane_offset,
+                                  shape=(width, height))
+            _check (not plane.size or plane.max () <= ncolors, path)
+
+        history = None
+        if flags & FLAG_HISTORY:
+            f.seek (history_offset)
+            data = f.read (history_size)
+            _check (len(data) >= 8, path)
+            ncommands, position = struct.unpack_from ('<II', data)
+            offset = 8
+            commands = []
+            for i in range (ncommands):
+                _check (offset + 4 <= len(data), path)
+                n, = struct.unpack_from ('<I', data, offset)
+                offset += 4
+                _check (offset + 8*n <= len(data), path)
+                cells = numpy.frombuffer (data, dtype='<i4', count=n, offset=offset)
+                offset += 4*n
+                old = numpy.frombuffer (data, dtype='<u2', count=n, offset=offset)
+                offset += 2*n
+                new = numpy.frombuffer (data, dtype='<u2', count=n, offset=offset)
+                offset += 2*n
+                _check (not n or (cells.min () >= 0 and cells.max () < width * height and
+                                  old.max () <= ncolors and new.max () <= ncolors), path)
+                commands.append (Command (cells, old, new))
+            _check (offset == len(data) and position <= ncommands, path)
+            history = (commands, position)
+    finally:
+        f.close()
+
+    return (plane, colors, history)
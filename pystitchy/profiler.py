@@ -0,0 +1,180 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import cProfile
+import functools
+import json
+import pstats
+import threading
+import timeit
+from collections import deque
+from StringIO import StringIO
+
+import numpy
+
+class Profiler:
+
+    # Timings and counters of the hot paths. Everything is a no-op until
+    # enable is called, so the instrumentation can stay in place. Timed
+    # functions also run in other threads, like the image import, so the
+    # timings and counters are only touched with the lock held.
+
+    def __init__ (self, max_samples = 10000):
+
+        self._enabled = False
+        self._max_samples = max_samples
+        self._timings = {}
+        self._counters = {}
+        self._lock = threading.Lock ()
+
+        # When armed, the next timed operation runs under cProfile
+        self._armed = False
+        self._profile = None
+
+    def enable (self):
+
+        self._enabled = True
+
+    def is_enabled (self):
+
+        return self._enabled
+
+    def reset (self):
+
+        with self._lock:
+            self._timings = {}
+            self._counters = {}
+
+    def add (self, name, seconds):
+
+        # Count and total are exact, percentiles are worked out from the
+        # most recent samples
+        with self._lock:
+            timing = self._timings.get (name)
+            if timing is None:
+                timing = self._timings[name] = [0, 0.0, deque (maxlen=self._max_samples)]
+
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2].append (seconds)
+
+    def count (self, name, n = 1):
+
+        if self._enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get (name, 0) + n
+
+    def profile_next (self):
+
+        # Capture a cProfile of the next timed operation
+        with self._lock:
+            self._armed = True
+
+    def get_profile (self):
+
+        # Text report of the last cProfile capture, or None
+        return self._profile
+
+    def get_stats (self):
+
+        # Copied with the lock held, and worked out without it
+        with self._lock:
+            counters = dict (self._counters)
+            timings = [(name, count, total, list (samples))
+                       for name, (count, total, samples) in self._timings.items()]
+
+        stats = {'timings': {}, 'counters': counters}
+
+        for name, count, total, samples in timings:
+            p50, p90, p99 = numpy.percentile (samples, (50, 90, 99))
+            stats['timings'][name] = {'count': count,
+                                      'total': total,
+                                      'mean': total / count,
+                                      'p50': p50,
+                                      'p90': p90,
+                                      'p99': p99,
+                                      'max': max (samples)}
+
+        return stats
+
+    def format_stats (self):
+
+        stats = self.get_stats ()
+
+        lines = ['%-20s %7s %9s %9s %9s %9s' % ('', 'count', 'total ms', 'p50 ms', 'p90 ms', 'p99 ms')]
+        for name in sorted (stats['timings'].keys()):
+            t = stats['timings'][name]
+            lines.append ('%-20s %7d %9.1f %9.2f %9.2f %9.2f' % (name, t['count'], t['total'] * 1000,
+                                                                t['p50'] * 1000, t['p90'] * 1000, t['p99'] * 1000))
+        for name in sorted (stats['counters'].keys()):
+            lines.append ('%-20s %7d' % (name, stats['counters'][name]))
+
+        return '\n'.join (lines)
+
+    def dump (self, path):
+
+        f = open (path, 'w')
+        json.dump (self.get_stats (), f, indent=2, sort_keys=True)
+        f.close ()
+
+    def _run (self, name, func, args, kwargs):
+
+        # Only one of the threads gets the armed capture
+        with self._lock:
+            armed = self._armed
+            self._armed = False
+
+        if armed:
+            profile = cProfile.Profile ()
+            start = timeit.default_timer ()
+            try:
+                return profile.runcall (func, *args, **kwargs)
+            finally:
+                self.add (name, timeit.default_timer () - start)
+                out = StringIO ()
+                out.write ('%s\n' % name)
+                pstats.Stats (profile, stream=out).sort_stats ('cumulative').print_stats (25)
+                self._profile = out.getvalue ()
+
+        start = timeit.default_timer ()
+        try:
+            return func (*args, **kwargs)
+        finally:
+            self.add (name, timeit.default_timer () - start)
+
+# Shared by the whole application
+profiler = Profiler ()
+
+def timed (name):
+
+    # Decorator recording the time taken by every call of a function while
+    # the profiler is enabled
+    def decorate (func):
+
+        @functools.wraps (func)
+        def wrapper (*args, **kwargs):
+            if not profiler.is_enabled ():
+                return func (*args, **kwargs)
+            return profiler._run (name, func, args, kwargs)
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,391 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import base64
+import binascii
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from cStringIO import StringIO
+from collections import OrderedDict, deque
+
+import numpy
+from color_matcher import METRICS, code2rgb
+from converter import init_worker, convert_image
+from dither import DITHER_MODES
+
+# Biggest pattern and request body the service accepts
+MAX_CELLS = 1000
+MAX_REQUEST_SIZE = 32 << 20
+
+def convert_job (job):
+
+    # Runs in a worker process. Returns the JSON text of the pattern, and
+    # the time it took, or the error message if the image cannot be
+    # converted.
+    data, xcells, ycells, codes, metric, mode, ncolors, confetti = job
+
+    start = time.time()
+    try:
+        pattern, matcher, palette = convert_image (StringIO (data), xcells, ycells, codes, metric, mode,
+                                                   ncolors, confetti)
+    except IOError:
+        # What PIL raises for anything it cannot read
+        return (None, time.time() - start, 'The image cannot be read')
+    except Exception as e:
+        return (None, time.time() - start, str(e))
+
+    return (pattern_json (pattern, matcher.get_dmcs (), palette), time.time() - start, None)
+
+def _is_int (value):
+
+    # JSON true and false are bools, which are also ints
+    return isinstance (value, int) and not isinstance (value, bool)
+
+def pattern_json (pattern, dmcs, palette):
+
+    # Only the colors in use are listed, most used first. Cells hold their
+    # position in the list plus one, 0 being an empty cell.
+    counts = numpy.bincount (pattern.ravel (), minlength=len(dmcs) + 1)
+    used = [i for i in numpy.argsort (-counts[1:], kind='mergesort') if counts[i + 1]]
+
+    table = numpy.zeros (len(dmcs) + 1, dtype=numpy.int32)
+    table[numpy.array (used, dtype=numpy.intp) + 1] = numpy.arange (1, len(used) + 1)
+
+    colors = []
+    for i in used:
+        code, name = palette[dmcs[i]]
+        colors.append ({'dmc': dmcs[i], 'name': name, 'rgb': code2rgb (code), 'stitches': int(counts[i + 1])})
+
+    return json.dumps ({'width': pattern.shape[1],
+                        'height': pattern.shape[0],
+                        'colors': colors,
+                        'cells': table[pattern].tolist ()})
+
+class ResultCache:
+
+    # Results by key, dropping the least recently used ones when together
+    # they take more than max_bytes. Shared by the request threads.
+
+    def __init__ (self, max_bytes = 64 << 20):
+
+        self._max_bytes = max_bytes
+        self._results = OrderedDict ()
+        self._bytes = 0
+        self._lock = threading.Lock ()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get (self, key):
+
+        with self._lock:
+            result = self._results.pop (key, None)
+            if result is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._results[key] = result
+            return result
+
+    def put (self, key, result):
+
+        with self._lock:
+            if key in self._results:
+                self._bytes -= len(self._results.pop (key))
+
+            # Anything bigger than the whole cache is not kept
+            if len(result) > self._max_bytes:
+                return
+
+            self._results[key] = result
+            self._bytes += len(result)
+
+            while self._bytes > self._max_bytes:
+                _key, dropped = self._results.popitem (last=False)
+                self._bytes -= len(dropped)
+                self.evictions += 1
+
+    def get_stats (self):
+
+        with self._lock:
+            return {'entries': len(self._results),
+                    'bytes': self._bytes,
+                    'max_bytes': self._max_bytes,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions}
+
+class QueueFull (Exception):
+
+    pass
+
+class ConversionService:
+
+    # Converts images in a pool of worker processes, with at most max_queue
+    # conversions waiting or running. Results are cached by the contents
+    # of the image and the settings, and requests for a conversion that
+    # is already running wait for it instead of converting again.
+
+    def __init__ (self, colors, workers = None, max_queue = 32, cache_bytes = 64 << 20, timeout = 300):
+
+        # colors is a dict dmc -> (code, name) with the colors to match to
+        self._colors = colors
+        self._workers = workers or multiprocessing.cpu_count ()
+        self._max_queue = max_queue
+        self._timeout = timeout
+        self._pool = multiprocessing.Pool (self._workers, init_worker, (colors,))
+        self._cache = ResultCache (cache_bytes)
+
+        self._lock = threading.Lock ()
+        self._running = {}
+
+        self._start = time.time()
+        self._requests = 0
+        self._rejected = 0
+        self._converted = 0
+        self._failed = 0
+        self._timed_out = 0
+        self._convert_time = 0.0
+
+        # Times of the last conversions, for the recent throughput. It is
+        # always over the whole window, so it starts low rather than with
+        # a burst of high rates.
+        self._recent = deque ()
+        self._window = 60.0
+
+    def close (self):
+
+        self._pool.terminate ()
+        self._pool.join ()
+
+    def parse_request (self, request):
+
+        # Job and cache key of a JSON conversion request. Raises ValueError
+        # if the request is not valid.
+        if not isinstance (request, dict):
+            raise ValueError ('The request must be a JSON object')
+
+        try:
+            data = base64.b64decode (request['image'])
+        except KeyError:
+            raise ValueError ('No image in the request')
+        except (TypeError, binascii.Error):
+            raise ValueError ('The image is not valid base64')
+
+        xcells = request.get ('width', 120)
+        ycells = request.get ('height', 80)
+        for size in (xcells, ycells):
+            if not _is_int (size) or not 1 <= size <= MAX_CELLS:
+                raise ValueError ('The width and height must be between 1 and %d' % MAX_CELLS)
+
+        codes = request.get ('palette')
+        if codes is not None:
+            if not isinstance (codes, list) or not codes:
+                raise ValueError ('The palette must be a list of DMC codes')
+            codes = sorted (set ([str(dmc) for dmc in codes]))
+            unknown = [dmc for dmc in codes if dmc not in self._colors]
+            if unknown:
+                raise ValueError ('Unknown DMC colors: %s' % ', '.join (unknown))
+
+        metric = request.get ('metric', 'redmean')
+        if metric not in METRICS:
+            raise ValueError ('The metric must be one of %s' % ', '.join (METRICS))
+
+        mode = request.get ('dither', 'none')
+        if mode not in DITHER_MODES:
+            raise ValueError ('The dithering mode must be one of %s' % ', '.join (DITHER_MODES))
+
+        ncolors = request.get ('num_colors')
+        if ncolors is not None and (not _is_int (ncolors) or ncolors < 1):
+            raise ValueError ('The number of colors must be at least 1')
+
+        confetti = request.get ('remove_confetti')
+        if confetti is not None and (not _is_int (confetti) or confetti < 2):
+            raise ValueError ('The confetti size must be at least 2')
+
+        settings = (xcells, ycells, codes and tuple (codes), metric, mode, ncolors, confetti)
+        key = hashlib.sha1 (hashlib.sha1 (data).hexdigest () + repr (settings)).hexdigest ()
+
+        return (key, (data, xcells, ycells, codes, metric, mode, ncolors, confetti))
+
+    def convert (self, key, job):
+
+        # Returns the JSON text of the pattern and whether it came from the
+        # cache. Raises QueueFull if there is no room for the job, and
+        # ValueError if the image cannot be converted.
+        with self._lock:
+            self._requests += 1
+
+            result = self._cache.get (key)
+            if result is not None:
+                return (result, True)
+
+            # A job keeps its place in the queue until the pool finishes it,
+            # even if the requests waiting for it time out, so there are
+            # never more than max_queue jobs in the pool. Requests for the
+            # same key meanwhile wait for that job.
+            running = self._running.get (key)
+            if running is None:
+                if len(self._running) >= self._max_queue:
+                    self._rejected += 1
+                    raise QueueFull ()
+
+                running = self._pool.apply_async (convert_job, (job,),
+                                                  callback=lambda result: self._finished (key, result))
+                self._running[key] = running
+
+        try:
+            result, elapsed, error = running.get (self._timeout)
+        except multiprocessing.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            raise
+
+        if error:
+            raise ValueError (error)
+
+        return (result, False)
+
+    def _finished (self, key, result):
+
+        # Called in the pool thread that collects the results, before the
+        # requests waiting for them see them
+        result, elapsed, error = result
+        now = time.time()
+
+        with self._lock:
+            del self._running[key]
+            if error:
+                self._failed += 1
+            else:
+                self._cache.put (key, result)
+                self._converted += 1
+                self._convert_time += elapsed
+
+            self._recent.append (now)
+            while self._recent[0] < now - self._window:
+                self._recent.popleft ()
+
+    def get_metrics (self):
+
+        now = time.time()
+
+        with self._lock:
+            while self._recent and self._recent[0] < now - self._window:
+                self._recent.popleft ()
+
+            uptime = now - self._start
+            done = self._converted + self._failed
+            return {'uptime': uptime,
+                    'workers': self._workers,
+                    'queue_depth': len(self._running),
+                    'max_queue': self._max_queue,
+                    'requests': self._requests,
+                    'rejected': self._rejected,
+                    'converted': self._converted,
+                    'failed': self._failed,
+                    'timed_out': self._timed_out,
+                    'mean_convert_time': self._convert_time / self._converted if self._converted else 0.0,
+                    'throughput': done / uptime if uptime else 0.0,
+                    'recent_throughput': len(self._recent) / self._window,
+                    'cache': self._cache.get_stats ()}
+
+class ServiceHandler (BaseHTTPRequestHandler):
+
+    # POST /convert with a JSON request converts an image, GET /metrics
+    # returns the state of the service
+
+    def do_GET (self):
+
+        if self.path == '/metrics':
+            self._send (200, json.dumps (self.server.service.get_metrics (), sort_keys=True))
+        else:
+            self._send_error (404, 'Not found')
+
+    def do_POST (self):
+
+        if self.path != '/convert':
+            self._send_error (404, 'Not found')
+            return
+
+        try:
+            length = int(self.headers.get ('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_error (400, 'Bad Content-Length')
+            return
+        if length > MAX_REQUEST_SIZE:
+            self._send_error (413, 'The request is too big')
+            return
+
+        service = self.server.service
+        try:
+            key, job = service.parse_request (json.loads (self.rfile.read (length)))
+            result, cached = service.convert (key, job)
+        except QueueFull:
+            self._send_error (503, 'Too many conversions waiting', {'Retry-After': '1'})
+        except multiprocessing.TimeoutError:
+            self._send_error (504, 'The conversion took too long')
+        except ValueError as e:
+            # Also what json raises for bad JSON
+            self._send_error (400, str(e))
+        else:
+            self._send (200, result, {'X-Cache': 'hit' if cached else 'miss', 'ETag': '"%s"' % key})
+
+    def log_message (self, format, *args):
+
+        if not self.server.quiet:
+            BaseHTTPRequestHandler.log_message (self, format, *args)
+
+    def _send_error (self, status, message, headers = {}):
+
+        self._send (status, json.dumps ({'error': message}), headers)
+
+    def _send (self, status, body, headers = {}):
+
+        self.send_response (status)
+        self.send_header ('Content-Type', 'application/json')
+        self.send_header ('Content-Length', str(len(body)))
+        for name, value in headers.items ():
+            self.send_header (name, value)
+        self.end_headers ()
+        self.wfile.write (body)
+
+class ServiceServer (ThreadingMixIn, HTTPServer):
+
+    # Every request is handled in its own thread, so many of them can wait
+    # for the worker pool at once
+
+    daemon_threads = True
+
+    def __init__ (self, address, service, quiet = False):
+
+        HTTPServer.__init__ (self, address, ServiceHandler)
+        self.service = service
+        self.quiet = quiet
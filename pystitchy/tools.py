@@ -0,0 +1,377 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy
+
+def line_cells (x0, y0, x1, y1):
+
+    # Cells of the Bresenham line from (x0, y0) to (x1, y1), both included,
+    # as arrays of x and y. Every step moves one cell along the major axis,
+    # and the minor axis follows the rounded position, as in the integer
+    # algorithm.
+    dx = x1 - x0
+    dy = y1 - y0
+    n = max (abs(dx), abs(dy))
+    steps = numpy.arange (n + 1)
+
+    if n == 0:
+        return (numpy.array ([x0]), numpy.array ([y0]))
+
+    if abs(dx) >= abs(dy):
+        xs = x0 + numpy.sign (dx) * steps
+        ys = y0 + numpy.sign (dy) * ((2 * abs(dy) * steps + n) // (2 * n))
+    else:
+        ys = y0 + numpy.sign (dy) * steps
+        xs = x0 + numpy.sign (dx) * ((2 * abs(dx) * steps + n) // (2 * n))
+
+    return (xs, ys)
+
+def path_cells (points):
+
+    # Cells of the lines joining a list of (x, y) points in order
+    if len(points) == 1:
+        return (numpy.array ([points[0][0]]), numpy.array ([points[0][1]]))
+
+    xs = []
+    ys = []
+    for (x0, y0), (x1, y1) in zip (points[:-1], points[1:]):
+        lx, ly = line_cells (x0, y0, x1, y1)
+        xs.append (lx)
+        ys.append (ly)
+
+    return (numpy.concatenate (xs), numpy.concatenate (ys))
+
+def flood_fill (plane, xcell, ycell, max_spans = 4096):
+
+    # Cells with the same color index as (xcell, ycell) and connected to it
+    # through their sides, as a boolean mask shaped like plane, which is
+    # indexed [x, y]. Scanline fill: every span along y is found and marked
+    # with array operations, and one seed is queued for every run of
+    # matching cells next to it. Regions broken into more than max_spans
+    # spans are labelled as a whole instead, which does not slow down with
+    # the number of spans.
+    width, height = plane.shape
+    pending = plane == plane[xcell, ycell]
+    region = numpy.zeros (plane.shape, dtype=bool)
+
+    stack = [(xcell, ycell)]
+    spans = 0
+    while stack:
+        x, y = stack.pop ()
+        line = pending[x]
+        if not line[y]:
+            continue
+
+        spans += 1
+        if spans > max_spans:
+            labels = label_components (plane == plane[xcell, ycell])
+            return labels == labels[xcell, ycell]
+
+        # First cell that does not match above and below y
+        above = line[y::-1]
+        k = above.argmin ()
+        y0 = 0 if above[k] else y - k + 1
+        below = line[y:]
+        k = below.argmin ()
+        y1 = height if below[k] else y + k
+
+        line[y0:y1] = False
+        region[x, y0:y1] = True
+
+        for nx in (x - 1, x + 1):
+            if 0 <= nx < width:
+                span = pending[nx, y0:y1]
+                starts = numpy.flatnonzero (span[1:] & ~span[:-1]) + 1
+                if span[0]:
+                    stack.append ((nx, y0))
+                stack.extend ([(nx, y0 + s) for s in starts.tolist()])
+
+    return region
+
+def label_components (plane):
+
+    # Label of the connected region of every cell, regions being cells of
+    # the same value joined through their sides. Labels are not
+    # consecutive; every region has the smallest run number in it.
+    #
+    # The runs of equal values along y are the nodes of a union-find,
+    # linked to the runs they touch in the next line. Roots are hooked to
+    # the smaller root of every link and then compressed with pointer
+    # jumping, all with array operations, until no link joins two roots.
+    starts = numpy.ones (plane.shape, dtype=bool)
+    starts[:,1:] = plane[:,1:] != plane[:,:-1]
+    runs = numpy.cumsum (starts.ravel ()).reshape (plane.shape) - 1
+    parent = numpy.arange (runs.size and runs[-1,-1] + 1)
+
+    # Cells next to each other in adjacent lines, taking a pair of runs
+    # only once, where either of them starts
+    first = runs[:-1]
+    second = runs[1:]
+    links = plane[1:] == plane[:-1]
+    links[:,1:] &= (first[:,1:] != first[:,:-1]) | (second[:,1:] != second[:,:-1])
+    u = first[links]
+    v = second[links]
+
+    while len(u):
+        pu = parent[u]
+        pv = parent[v]
+        joined = pu != pv
+        if not joined.any ():
+            break
+
+        u = u[joined]
+        v = v[joined]
+        low = numpy.minimum (pu[joined], pv[joined])
+        high = numpy.maximum (pu[joined], pv[joined])
+
+        # Every root is hooked to the smallest root it is linked to. A
+        # plain assignment keeps only one of the links of a root, which
+        # takes as many rounds as links on fragmented planes, so the links
+        # that lost are applied again with the slower minimum.at.
+        parent[high] = low
+        lost = low < parent[high]
+        numpy.minimum.at (parent, high[lost], low[lost])
+        while True:
+            grand = parent[parent]
+            if (grand == parent).all ():
+                break
+            parent = grand
+
+    return parent[runs]
+
+def remove_confetti (plane, min_size, rounds = 8):
+
+    # Copy of a plane where every region with fewer than min_size cells
+    # is merged into a bigger region next to it, taking its color. Empty
+    # cells, with color index 0, are left as they are, and are not merged
+    # into either, so stitches only next to empty cells stay. The
+    # color is the one the small region shares most sides with, among the
+    # regions bigger than itself, and the region is the biggest one of
+    # that color. Regions are ordered by size and then label, so merges
+    # never go around in circles.
+    #
+    # The plane is labelled only once. Every cell points to a cell of the
+    # region it is merged into, and the merged regions that are still too
+    # small merge again as a whole, for at most a number of rounds.
+    plane = plane.copy ()
+    if min_size < 2 or not plane.size:
+        return plane
+
+    values = plane.ravel ()
+    ncolors = int(values.max ()) + 1
+
+    labels = label_components (plane).ravel ()
+    sizes = numpy.bincount (labels)
+    colors = numpy.zeros (len(sizes), dtype=plane.dtype)
+    colors[labels] = values
+
+    # Size of the region of every cell, all the big ones being as big as
+    # each other. Empty cells are never removed, so they count as big.
+    dtype = numpy.uint8 if min_size < 256 else numpy.int64
+    cell_sizes = numpy.minimum (sizes, min_size).astype (dtype)[labels].reshape (plane.shape)
+    cell_sizes[plane == 0] = min_size
+    cells = numpy.flatnonzero (cell_sizes < min_size)
+    if not len(cells):
+        return plane
+
+    pointers = numpy.arange (values.size)
+
+    # A cell of every region
+    anchors = numpy.zeros (len(sizes), dtype=numpy.int64)
+    anchors[labels] = pointers
+
+    # Single cells are most of the confetti, and simpler to merge
+    _merge_cells (plane, cell_sizes, ncolors, pointers)
+
+    # Every cell belongs to the region at the end of its chain, and the
+    # cells that make too small a cluster with it are merged again
+    pending = cells
+    for _ in range (rounds):
+        pointers = _follow (pointers)
+        roots = labels[pointers]
+        cluster_sizes = numpy.bincount (roots, minlength=len(sizes))
+        pending = pending[cluster_sizes[roots[pending]] < min_size]
+        if not _merge_regions (pending, plane.shape, roots, cluster_sizes, colors, ncolors, anchors, pointers):
+            break
+    pointers = _follow (pointers)
+
+    values[cells] = values[pointers[cells]]
+
+    return plane
+
+def _follow (pointers):
+
+    # Pointers to the end of the chains, pointing every cell to where its
+    # pointed cell points until that doesn't change
+    while True:
+        ends = pointers[pointers]
+        if (ends == pointers).all ():
+            return pointers
+        pointers = ends
+
+def _merge_cells (plane, cell_sizes, ncolors, pointers):
+
+    # Points every single cell region to the neighbour it merges into,
+    # with whole plane operations on the four sides of every cell. Every
+    # other region is bigger, and single cells have their labels in the
+    # order of the cells, so the next cells along x and y are the bigger
+    # ones. Empty cells are never merged into.
+    width, height = plane.shape
+
+    # Out of the plane, the sides have no size and are never chosen
+    colors = numpy.zeros ((width + 2, height + 2), dtype=plane.dtype)
+    colors[1:-1,1:-1] = plane
+    sizes = numpy.zeros ((width + 2, height + 2), dtype=cell_sizes.dtype)
+    sizes[1:-1,1:-1] = cell_sizes
+
+    views = ((slice (0, -2), slice (1, -1)), (slice (2, None), slice (1, -1)),
+             (slice (1, -1), slice (0, -2)), (slice (1, -1), slice (2, None)))
+    steps = (-height, height, -1, 1)
+    colors = [colors[view] for view in views]
+    sizes = [sizes[view] for view in views]
+    valid = [(sizes[k] > (steps[k] < 0)) & (colors[k] != 0) for k in range (4)]
+
+    # Every side scores the number of sides with its color, then the
+    # color, then the size of its region and then the side itself, and 0
+    # when it can't be chosen
+    same = {}
+    for j in range (4):
+        for k in range (j + 1, 4):
+            same[j, k] = same[k, j] = colors[j] == colors[k]
+
+    scale = int(sizes[0].max ()) + 1
+    dtype = numpy.int32 if 20 * ncolors * scale < 2 ** 31 else numpy.int64
+    best = numpy.zeros ((width, height), dtype=dtype)
+    for k in range (4):
+        votes = valid[k].astype (dtype)
+        for j in range (4):
+            if j != k:
+                votes += valid[j] & same[j, k]
+        score = ((votes * ncolors + colors[k]) * scale + sizes[k]) * 4 + k
+        score *= valid[k]
+        numpy.maximum (best, score, best)
+
+    merged = numpy.flatnonzero ((cell_sizes == 1) & (best > 0))
+    pointers[merged] = merged + numpy.array (steps)[best.ravel ()[merged] & 3]
+
+def _neighbours (cells, shape):
+
+    # (valid, neighbour) for the four sides of an array of flat cell
+    # indices. Sides out of the plane point back to the cell itself.
+    width, height = shape
+    xs, ys = numpy.divmod (cells, height)
+
+    sides = []
+    for valid, step in ((xs > 0, -height), (xs < width - 1, height),
+                        (ys > 0, -1), (ys < height - 1, 1)):
+        sides.append ((valid, numpy.where (valid, cells + step, cells)))
+
+    return sides
+
+def _merge_regions (cells, shape, roots, cluster_sizes, colors, ncolors, anchors, pointers):
+
+    # One round of merges of the merged regions, or clusters, that are
+    # still too small. A cluster is known by the label of the region at
+    # its end, and counts its sides to every color with the sides of all
+    # its cells. A cluster next to a bigger one of its own color is part
+    # of the same region, so it joins it without changing color. Returns
+    # whether any cluster was merged.
+    owners = roots[cells]
+
+    sources = []
+    targets = []
+    for side, neighbour in _neighbours (cells, shape):
+        source = owners[side]
+        target = roots[neighbour[side]]
+        bigger = (cluster_sizes[target] > cluster_sizes[source]) | \
+                 ((cluster_sizes[target] == cluster_sizes[source]) & (target > source))
+        bigger &= colors[target] != 0
+        sources.append (source[bigger])
+        targets.append (target[bigger])
+
+    sources = numpy.concatenate (sources).astype (numpy.int64)
+    targets = numpy.concatenate (targets).astype (numpy.int64)
+    if not len(sources):
+        return False
+
+    # Sides from every cluster to every color. Sorted again by cluster
+    # and number of sides, the color with most of them is the last one
+    # of every cluster. Its own color goes before any other.
+    keys = numpy.sort (sources * ncolors + colors[targets])
+    starts = numpy.flatnonzero (numpy.r_[True, keys[1:] != keys[:-1]])
+    counts = numpy.diff (numpy.r_[starts, len(keys)])
+    keys = keys[starts]
+    counts[colors[keys // ncolors] == keys % ncolors] = counts.max () + 1
+    scale = (int(counts.max ()) + 1) * ncolors
+    keys = numpy.sort (keys // ncolors * scale + counts * ncolors + keys % ncolors)
+    last = _last_of_groups (keys // scale)
+    chosen = numpy.zeros (len(cluster_sizes), dtype=numpy.int64)
+    chosen[keys[last] // scale] = keys[last] % ncolors
+
+    # Among the clusters of that color, the biggest one, and among the
+    # biggest ones the last one
+    same = colors[targets] == chosen[sources]
+    sources = sources[same]
+    targets = targets[same]
+    scale = int(cluster_sizes.max ()) + 1
+    keys = numpy.sort (sources * scale + cluster_sizes[targets])
+    last = _last_of_groups (keys // scale)
+    biggest = numpy.zeros (len(cluster_sizes), dtype=numpy.int64)
+    biggest[keys[last] // scale] = keys[last] % scale
+
+    biggest = cluster_sizes[targets] == biggest[sources]
+    sources = sources[biggest]
+    targets = targets[biggest]
+    scale = len(cluster_sizes)
+    keys = numpy.sort (sources * scale + targets)
+    last = _last_of_groups (keys // scale)
+
+    ends = numpy.zeros (len(cluster_sizes), dtype=numpy.int64) - 1
+    ends[keys[last] // scale] = anchors[keys[last] % scale]
+    merged = ends[owners] >= 0
+    pointers[cells[merged]] = ends[owners[merged]]
+
+    return True
+
+def _last_of_groups (values):
+
+    # Mask of the last item of every run of equal values
+    return numpy.r_[values[1:] != values[:-1], True]
+
+def color_mask (plane, index):
+
+    # Every cell with a color index
+    return plane == index
+
+def rectangle_mask (shape, x0, y0, x1, y1):
+
+    # Cells in the rectangle between two corner cells, both included and
+    # in any order, clipped to the plane
+    mask = numpy.zeros (shape, dtype=bool)
+
+    xstart = max (min (x0, x1), 0)
+    xstop = min (max (x0, x1) + 1, shape[0])
+    ystart = max (min (y0, y1), 0)
+    ystop = min (max (y0, y1) + 1, shape[1])
+    if xstart < xstop and ystart < ystop:
+        mask[xstart:xstop, ystart:ystop] = True
+
+    return mask
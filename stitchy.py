@@ -22,12 +22,37 @@
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
 
+import argparse
+import os
+
 from pystitchy.app import MyApp
+from pystitchy.profiler import profiler
 
 def run():
+    parser = argparse.ArgumentParser (description='Stitchy Studio')
+    parser.add_argument ('--profile', nargs='?', const='stitchy-profile.json', metavar='FILE',
+                         help='record timings of the hot paths and write them to FILE on exit '
+                              '(default: stitchy-profile.json). Also enabled by setting STITCHY_PROFILE to 1 or a file name.')
+    args = parser.parse_args ()
+
+    # STITCHY_PROFILE may be a file name, or a yes or no value to turn
+    # profiling on or off. Empty means off too.
+    output = args.profile
+    if not output:
+        output = os.environ.get ('STITCHY_PROFILE', '').strip ()
+        if output.lower () in ('0', 'no', 'off', 'false'):
+            output = None
+        elif output.lower () in ('1', 'yes', 'on', 'true'):
+            output = 'stitchy-profile.json'
+    if output:
+        profiler.enable ()
+
     app = MyApp('stitchy_gui.xrc','data/colors.txt')
     app.MainLoop()
 
+    if output:
+        profiler.dump (output)
+
 if '__main__' == __name__:
 
     run()
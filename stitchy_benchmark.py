@@ -0,0 +1,351 @@
+#!/usr/bin/env python2
+
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+
+from pystitchy.palette import load_palette, _parse_colors
+from pystitchy.color_matcher import ColorMatcher
+from pystitchy.converter import load_image, convert_pixels, Image
+from pystitchy.chunked_matrix import ChunkedMatrix
+from pystitchy.command_log import Command, CommandLog
+from pystitchy.pattern import Pattern
+from pystitchy.chart import export_chart
+from pystitchy.grid_shapes import grid_lines, cell_rects
+from pystitchy.tools import remove_confetti
+
+class RecordingDC:
+
+    # Stands for a wx.DC, counting the calls made to it and the number of
+    # shapes passed to the list drawing methods
+
+    def __init__ (self):
+
+        self.calls = {}
+        self.shapes = 0
+
+    def __getattr__ (self, name):
+
+        def record (*args):
+            self.calls[name] = self.calls.get (name, 0) + 1
+            if name.endswith ('List'):
+                self.shapes += len(args[0])
+
+        return record
+
+def measure (func, repeat):
+
+    # Runs func repeat times, returning the timings in seconds
+    times = []
+    for i in range (repeat):
+        start = time.time()
+        func ()
+        times.append (time.time() - start)
+
+    return {'repeat': repeat,
+            'min': min (times),
+            'median': float (numpy.median (times)),
+            'mean': float (numpy.mean (times))}
+
+def test_image (width, height, seed = 0):
+
+    # Gradients with some noise, so there are many distinct colors but
+    # also areas of similar ones, like in a photo
+    random = numpy.random.RandomState (seed)
+    x = numpy.linspace (0, 255, width)[numpy.newaxis,:]
+    y = numpy.linspace (0, 255, height)[:,numpy.newaxis]
+
+    pixels = numpy.empty ((height, width, 3))
+    pixels[:,:,0] = x
+    pixels[:,:,1] = y
+    pixels[:,:,2] = (x + y) / 2
+    pixels += random.normal (0, 12, pixels.shape)
+
+    return numpy.clip (pixels, 0, 255).astype (numpy.uint8)
+
+def palette_subset (colors, size):
+
+    dmcs = sorted (colors.keys())[:size]
+
+    return dict ([(dmc, colors[dmc]) for dmc in dmcs])
+
+def bench_palette (results, colorsfn, repeat):
+
+    results['palette_parse'] = measure (lambda: _parse_colors (colorsfn), repeat)
+
+    # The first load writes the cache if needed, the rest read it
+    load_palette (colorsfn)
+    results['palette_load_cached'] = measure (lambda: load_palette (colorsfn), repeat)
+
+def bench_matching (results, colors, repeat):
+
+    pixels = test_image (256, 256)
+
+    for size in (10, 50, len(colors)):
+        palette = palette_subset (colors, size)
+
+        # A new matcher every time measures the lookup table being filled,
+        # the same matcher measures lookups of known colors
+        results['match_cold_%d' % size] = measure (lambda: ColorMatcher (palette).match (pixels), repeat)
+        matcher = ColorMatcher (palette)
+        matcher.match (pixels)
+        results['match_warm_%d' % size] = measure (lambda: matcher.match (pixels), repeat)
+
+def bench_import (results, colors, repeat, tmpdir):
+
+    source = test_image (1600, 1200)
+
+    path = None
+    if Image is not None:
+        path = os.path.join (tmpdir, 'source.png')
+        Image.fromarray (source).save (path)
+
+    for xcells, ycells in ((120, 80), (400, 300), (800, 600)):
+        def run ():
+            if path:
+                pixels, alpha = load_image (path, xcells, ycells)
+            else:
+                # Without PIL only the conversion is measured
+                pixels, alpha = source[:ycells, :xcells], None
+            convert_pixels (ColorMatcher (colors), pixels, alpha)
+
+        results['import_%dx%d' % (xcells, ycells)] = measure (run, repeat)
+
+    results['import_loads_image'] = path is not None
+
+def bench_confetti (results, colors, repeat):
+
+    # Dithered imports are where most of the confetti comes from
+    matcher = ColorMatcher (palette_subset (colors, 30))
+
+    for xcells, ycells in ((400, 300), (800, 600)):
+        pattern = convert_pixels (matcher, test_image (xcells, ycells), mode = 'floyd-steinberg')
+        results['remove_confetti_%dx%d' % (xcells, ycells)] = measure (lambda: remove_confetti (pattern, 3), repeat)
+
+    # Random colors are the worst case, almost every stitch being confetti
+    random = numpy.random.RandomState (0)
+    for xcells, ycells in ((1000, 1000), (2000, 2000)):
+        plane = random.randint (1, 21, (xcells, ycells)).astype (numpy.uint16)
+        results['remove_confetti_random_%dx%d' % (xcells, ycells)] = measure (lambda: remove_confetti (plane, 3), repeat)
+
+def bench_undo (results, repeat):
+
+    width, height = 400, 300
+    random = numpy.random.RandomState (0)
+    cells = random.randint (0, width * height, 20000)
+    values = random.randint (1, 50, len(cells)).astype (numpy.uint16)
+
+    # One command per cell, like single clicks, and the matrix they are
+    # applied to
+    commands = [Command (cells[i:i+1], numpy.zeros (1, dtype=numpy.uint16), values[i:i+1])
+                for i in range (len(cells))]
+    matrix = ChunkedMatrix (width, height)
+
+    def push ():
+        log = CommandLog (len(commands))
+        for command in commands:
+            log.push (command)
+        return log
+
+    def undo_redo ():
+        log = push ()
+        command = log.undo ()
+        while command is not None:
+            matrix.set_flat (command.cells, command.old)
+            command = log.undo ()
+        command = log.redo ()
+        while command is not None:
+            matrix.set_flat (command.cells, command.new)
+            command = log.redo ()
+
+    results['undo_push_%d' % len(commands)] = measure (push, repeat)
+    results['undo_redo_%d' % len(commands)] = measure (undo_redo, repeat)
+
+def bench_pattern (results, repeat, tmpdir):
+
+    xcells, ycells = 400, 300
+    pattern = Pattern (xcells, ycells)
+    palette = [tuple (rgb) for rgb in test_image (50, 1)[0].tolist()]
+    random = numpy.random.RandomState (0)
+    xs = random.randint (0, xcells, 100000)
+    ys = random.randint (0, ycells, len(xs))
+    colors = random.randint (0, len(palette), len(xs))
+
+    def set_cells ():
+        for x, y, c in zip (xs.tolist(), ys.tolist(), colors.tolist()):
+            pattern.set_cell (x, y, palette[c])
+
+    results['set_cell_%d' % len(xs)] = measure (set_cells, repeat)
+
+    path = os.path.join (tmpdir, 'chart.png')
+    results['export_chart_%dx%d' % (xcells, ycells)] = measure (lambda: export_chart (path, pattern, 10), repeat)
+
+def bench_grid_shapes (results, repeat):
+
+    # The lines and rectangles Grid draws for a whole pattern, as lists
+    # ready for the dc, at the default zoom and zoomed out as far as
+    # possible. These need no wx, unlike drawing them.
+    xcells, ycells = 400, 300
+    pattern = Pattern (xcells, ycells)
+    palette = [tuple (rgb) for rgb in test_image (50, 1)[0].tolist()]
+    indices = numpy.array ([0] + pattern.get_color_indices (palette), dtype=numpy.uint16)
+    random = numpy.random.RandomState (0)
+    plane = indices[random.randint (0, len(indices), (xcells, ycells))]
+    pattern.set_plane (plane)
+
+    for name, step in (('default', 10), ('zoomed_out', 2)):
+        xs = numpy.arange (xcells + 1) * step + step * 5
+        ys = numpy.arange (ycells + 1) * step + step * 5
+
+        def build ():
+            shapes = [lines.tolist() for lines in grid_lines (xs, ys, 0, 0, xcells, ycells)]
+            cells = pattern.read (0, 0, xcells, ycells)
+            shapes.extend ([rects.tolist() for index, rects in cell_rects (cells, xs, ys, 0, 0, step)])
+            return shapes
+
+        key = 'grid_shapes_%s' % name
+        results[key] = measure (build, repeat)
+        results[key]['shapes'] = sum (len(s) for s in build ())
+
+def bench_grid (results, repeat):
+
+    # Grid needs wx, and wx needs an application object, which may not be
+    # possible to create without a display
+    try:
+        import wx
+        if not wx.GetApp ():
+            app = wx.App (False)
+        from pystitchy.grid import Grid
+    except (Exception, SystemExit) as e:
+        results['grid_skipped'] = str(e) or e.__class__.__name__
+        return
+
+    xcells, ycells = 400, 300
+    grid = Grid (Pattern (xcells, ycells))
+    palette = [wx.Colour (r, g, b) for r, g, b in test_image (50, 1)[0].tolist()]
+    random = numpy.random.RandomState (0)
+    xs = random.randint (0, xcells, 100000)
+    ys = random.randint (0, ycells, len(xs))
+    colors = random.randint (0, len(palette), len(xs))
+
+    def add_cells ():
+        for x, y, c in zip (xs.tolist(), ys.tolist(), colors.tolist()):
+            grid.add_cell (x, y, palette[c], False)
+
+    results['add_cell_%d' % len(xs)] = measure (add_cells, repeat)
+
+    # The whole grid at the default zoom, and then zoomed out as far as
+    # possible
+    for name in ('default', 'zoomed_out'):
+        if name == 'zoomed_out':
+            size = None
+            while size != grid.get_size ():
+                size = grid.get_size ()
+                grid.decrease_zoom ()
+
+        width, height = grid.get_size ()
+        dc = RecordingDC ()
+        key = 'draw_grid_%s' % name
+        results[key] = measure (lambda: grid.draw_grid (dc, [wx.Rect (0, 0, width, height)]), repeat)
+        results[key]['calls'] = dict ([(k, v // repeat) for k, v in dc.calls.items()])
+        results[key]['shapes'] = dc.shapes // repeat
+
+def compare (report, baseline):
+
+    # Ratio of the best times to those of an earlier run, slower ones
+    # being above 1
+    for name in sorted (report['results'].keys()):
+        new = report['results'][name]
+        old = baseline['results'].get (name)
+        if isinstance (new, dict) and isinstance (old, dict) and old['min'] > 0:
+            print >> sys.stderr, '%-28s %8.4f s  %6.2fx' % (name, new['min'], new['min'] / old['min'])
+
+def git_revision ():
+
+    try:
+        return subprocess.check_output (['git', 'rev-parse', 'HEAD'],
+                                        cwd=os.path.dirname (os.path.abspath (__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run ():
+
+    parser = argparse.ArgumentParser (description='Measure the performance of the hot paths, without a display')
+    parser.add_argument ('-o', '--output',
+                         help='JSON file for the results (default: standard output)')
+    parser.add_argument ('-r', '--repeat', type=int, default=5,
+                         help='times every benchmark is run (default: 5)')
+    parser.add_argument ('-c', '--colors',
+                         default=os.path.join (os.path.dirname (os.path.abspath (__file__)), 'data', 'colors.txt'),
+                         help='colors file (default: data/colors.txt)')
+    parser.add_argument ('-b', '--baseline',
+                         help='JSON file of an earlier run to compare the results with')
+    args = parser.parse_args ()
+
+    results = {}
+    tmpdir = tempfile.mkdtemp ()
+    try:
+        bench_palette (results, args.colors, args.repeat)
+        colors = load_palette (args.colors)[1]
+        bench_matching (results, colors, args.repeat)
+        bench_import (results, colors, args.repeat, tmpdir)
+        bench_confetti (results, colors, args.repeat)
+        bench_undo (results, args.repeat)
+        bench_pattern (results, args.repeat, tmpdir)
+        bench_grid_shapes (results, args.repeat)
+        bench_grid (results, args.repeat)
+    finally:
+        shutil.rmtree (tmpdir)
+
+    report = {'revision': git_revision (),
+              'time': time.strftime ('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version (),
+              'numpy': numpy.__version__,
+              'machine': platform.machine (),
+              'results': results}
+
+    if args.output:
+        f = open (args.output, 'w')
+        json.dump (report, f, indent=2, sort_keys=True)
+        f.close ()
+    else:
+        json.dump (report, sys.stdout, indent=2, sort_keys=True)
+        print
+
+    if args.baseline:
+        f = open (args.baseline, 'r')
+        compare (report, json.load (f))
+        f.close ()
+
+if '__main__' == __name__:
+
+    run()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python2
+
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+
+from pystitchy.palette import load_colors, select_palette
+from pystitchy.color_matcher import METRICS
+from pystitchy.converter import init_worker, convert_image
+from pystitchy.dither import DITHER_MODES
+from pystitchy.pattern_file import save_text, save_pattern
+
+IMAGE_EXTENSIONS = ('.bmp', '.gif', '.jpg', '.jpeg', '.png', '.pcx', '.tif', '.tiff')
+
+def convert (job):
+
+    path, output, xcells, ycells, text, mode, ncolors, metric, confetti = job
+
+    start = time.time()
+    try:
+        pattern, matcher, palette = convert_image (path, xcells, ycells, None, metric, mode, ncolors, confetti)
+        if text:
+            save_text (output, pattern, matcher.get_dmcs(), palette)
+        else:
+            colors = zip (matcher.get_dmcs(), map (tuple, matcher.get_rgb().tolist()))
+            save_pattern (output, pattern.T, colors)
+    except Exception, e:
+        return (path, None, time.time() - start, str(e))
+
+    return (path, pattern.shape, time.time() - start, None)
+
+def find_images (inputs):
+
+    # Inputs may be image files, directories or glob patterns
+    paths = []
+    for i in inputs:
+        if os.path.isdir (i):
+            for fn in sorted (os.listdir (i)):
+                if os.path.splitext (fn)[1].lower() in IMAGE_EXTENSIONS:
+                    paths.append (os.path.join (i, fn))
+        elif os.path.exists (i):
+            paths.append (i)
+        else:
+            paths.extend (sorted (glob.glob (i)))
+
+    # The same image may be found through several inputs
+    seen = set ()
+    unique = []
+    for path in paths:
+        key = os.path.normcase (os.path.abspath (path))
+        if key not in seen:
+            seen.add (key)
+            unique.append (path)
+
+    return unique
+
+def output_paths (paths, output_dir, extension):
+
+    # Pattern file for every image, named after it. Images with the same
+    # name in different directories, or differing only in the extension
+    # or case, get a numbered suffix instead of overwriting each other.
+    taken = set ()
+    outputs = []
+    for path in paths:
+        name = os.path.splitext (os.path.basename (path))[0]
+        candidate = name
+        n = 1
+        while candidate.lower() in taken:
+            n += 1
+            candidate = '%s-%d' % (name, n)
+        taken.add (candidate.lower())
+        outputs.append (os.path.join (output_dir, candidate + extension))
+
+    return outputs
+
+def run ():
+
+    parser = argparse.ArgumentParser (description='Convert images to cross stitch patterns')
+    parser.add_argument ('images', nargs='+',
+                         help='image files, directories or glob patterns')
+    parser.add_argument ('-o', '--output-dir', default='.',
+                         help='directory for the pattern files (default: current directory)')
+    parser.add_argument ('-p', '--palette',
+                         help='comma separated DMC codes, or a file with them, to use instead of all the colors')
+    parser.add_argument ('-c', '--colors',
+                         default=os.path.join (os.path.dirname (os.path.abspath (__file__)), 'data', 'colors.txt'),
+                         help='colors file (default: data/colors.txt)')
+    parser.add_argument ('-W', '--width', type=int, default=120,
+                         help='pattern width in stitches (default: 120)')
+    parser.add_argument ('-H', '--height', type=int, default=80,
+                         help='pattern height in stitches (default: 80)')
+    parser.add_argument ('-t', '--text', action='store_true',
+                         help='write text patterns instead of binary .stitchy files')
+    parser.add_argument ('-n', '--num-colors', type=int,
+                         help='use only the N palette colors that best represent every image')
+    parser.add_argument ('-m', '--metric', choices=METRICS, default='redmean',
+                         help='color difference used to match colors (default: redmean)')
+    parser.add_argument ('-d', '--dither', choices=DITHER_MODES, default='none',
+                         help='dithering mode (default: none)')
+    parser.add_argument ('-r', '--remove-confetti', type=int, metavar='N', dest='confetti',
+                         help='merge regions of fewer than N stitches into the colors around them')
+    parser.add_argument ('-j', '--jobs', type=int, default=multiprocessing.cpu_count(),
+                         help='number of worker processes (default: number of CPUs)')
+    args = parser.parse_args ()
+
+    try:
+        palette = select_palette (load_colors (args.colors), args.palette)
+    except KeyError, e:
+        parser.error ('Unknown DMC color %s' % e)
+    if not palette:
+        parser.error ('The palette is empty')
+    if args.num_colors is not None and args.num_colors < 1:
+        parser.error ('The number of colors must be at least 1')
+    if args.confetti is not None and args.confetti < 2:
+        parser.error ('The confetti size must be at least 2')
+
+    paths = find_images (args.images)
+    if not paths:
+        parser.error ('No images found')
+
+    if not os.path.isdir (args.output_dir):
+        os.makedirs (args.output_dir)
+
+    jobs = []
+    for path, output in zip (paths, output_paths (paths, args.output_dir, '.txt' if args.text else '.stitchy')):
+        name = os.path.splitext (os.path.basename (path))[0]
+        if os.path.splitext (os.path.basename (output))[0] != name:
+            print >> sys.stderr, '%s: saved as %s, the name is already taken' % (path, output)
+        jobs.append ((path, output, args.width, args.height, args.text, args.dither, args.num_colors, args.metric, args.confetti))
+
+    start = time.time()
+
+    pool = multiprocessing.Pool (args.jobs, init_worker, (palette,))
+
+    converted = 0
+    stitches = 0
+    for path, shape, elapsed, error in pool.imap_unordered (convert, jobs):
+        if error:
+            print >> sys.stderr, '%s: failed (%s)' % (path, error)
+        else:
+            converted += 1
+            stitches += shape[0] * shape[1]
+            print '%s: %dx%d in %.3f s' % (path, shape[1], shape[0], elapsed)
+
+    pool.close()
+    pool.join()
+
+    elapsed = time.time() - start
+    print 'Converted %d of %d images in %.2f s (%.1f images/s, %.0f stitches/s)' % (
+        converted, len(jobs), elapsed, converted / elapsed, stitches / elapsed)
+
+    if converted < len(jobs):
+        sys.exit (1)
+
+if '__main__' == __name__:
+
+    run()
@@ -0,0 +1,83 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import argparse
+import multiprocessing
+import os
+import sys
+
+from pystitchy.palette import load_colors, select_palette
+from pystitchy.service import ConversionService, ServiceServer
+
+def run ():
+
+    parser = argparse.ArgumentParser (description='Convert images to cross stitch patterns over HTTP, on this computer only',
+                                      epilog='POST /convert with a JSON object with the image, base64 encoded, in "image", '
+                                             'and optionally "width", "height", "palette" (a list of DMC codes), "metric", '
+                                             '"dither", "num_colors" and "remove_confetti". GET /metrics for the state '
+                                             'of the queue, the workers and the cache.')
+    parser.add_argument ('-P', '--port', type=int, default=8642,
+                         help='port to listen on, on localhost (default: 8642)')
+    parser.add_argument ('-p', '--palette',
+                         help='comma separated DMC codes, or a file with them, to use instead of all the colors')
+    parser.add_argument ('-c', '--colors',
+                         default=os.path.join (os.path.dirname (os.path.abspath (__file__)), 'data', 'colors.txt'),
+                         help='colors file (default: data/colors.txt)')
+    parser.add_argument ('-j', '--jobs', type=int, default=multiprocessing.cpu_count(),
+                         help='number of worker processes (default: number of CPUs)')
+    parser.add_argument ('-q', '--queue-size', type=int, default=32,
+                         help='conversions that may be waiting or running at once (default: 32)')
+    parser.add_argument ('-s', '--cache-size', type=int, default=64,
+                         help='size of the result cache in MB (default: 64)')
+    parser.add_argument ('--quiet', action='store_true',
+                         help='do not log every request')
+    args = parser.parse_args ()
+
+    try:
+        colors = select_palette (load_colors (args.colors), args.palette)
+    except KeyError as e:
+        parser.error ('Unknown DMC color %s' % e)
+    if not colors:
+        parser.error ('The palette is empty')
+    if args.jobs < 1 or args.queue_size < 1 or args.cache_size < 0:
+        parser.error ('The jobs and queue size must be at least 1, and the cache size not negative')
+
+    service = ConversionService (colors, args.jobs, args.queue_size, args.cache_size << 20)
+    try:
+        server = ServiceServer (('127.0.0.1', args.port), service, args.quiet)
+    except IOError as e:
+        service.close ()
+        print >> sys.stderr, 'Cannot listen on port %d: %s' % (args.port, e)
+        sys.exit (1)
+
+    print 'Listening on http://127.0.0.1:%d/ with %d workers' % (args.port, args.jobs)
+    try:
+        server.serve_forever ()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close ()
+        service.close ()
+
+if '__main__' == __name__:
+
+    run()
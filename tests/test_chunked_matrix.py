@@ -0,0 +1,110 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import unittest
+import numpy
+
+from pystitchy.chunked_matrix import ChunkedMatrix
+
+class ChunkedMatrixTest (unittest.TestCase):
+
+    def setUp (self):
+
+        # Chunks of 4 x 4, the last ones only partly inside the matrix
+        self.matrix = ChunkedMatrix (10, 7, 4)
+        self.dense = numpy.zeros ((10, 7), dtype=numpy.uint16)
+
+    def check (self):
+
+        self.assertTrue ((self.matrix.read (0, 0, 10, 7) == self.dense).all ())
+
+    def test_unallocated_chunks_read_as_zero (self):
+
+        self.matrix.set (1, 1, 5)
+        self.dense[1, 1] = 5
+
+        self.assertEqual (self.matrix.get (9, 6), 0)
+        self.assertEqual (self.matrix.read (4, 4, 8, 7).tolist (), [[0] * 3] * 4)
+        self.assertEqual (self.matrix.get_flat ([0, 8, 69]).tolist (), [0, 5, 0])
+        self.check ()
+
+        # Zeros do not need a chunk, and still read as zeros
+        self.matrix.set (9, 6, 0)
+        self.matrix.set_flat ([20, 30], 0)
+        self.check ()
+
+    def test_get_set_across_chunks (self):
+
+        for x, y in ((3, 3), (4, 3), (3, 4), (4, 4), (9, 6), (0, 6)):
+            self.matrix.set (x, y, x * 10 + y)
+            self.dense[x, y] = x * 10 + y
+
+        for x in range (10):
+            for y in range (7):
+                self.assertEqual (self.matrix.get (x, y), self.dense[x, y])
+        self.check ()
+
+    def test_read_write_across_chunks (self):
+
+        values = numpy.arange (5 * 4).reshape (5, 4) + 1
+        self.matrix.write (2, 2, values)
+        self.dense[2:7, 2:6] = values
+
+        self.check ()
+        self.assertEqual (self.matrix.read (3, 1, 9, 5).tolist (), self.dense[3:9, 1:5].tolist ())
+
+    def test_set_flat_across_chunks (self):
+
+        cells = numpy.array ([0, 3, 4, 27, 28, 35, 69])
+        values = numpy.arange (len(cells)) + 1
+        self.matrix.set_flat (cells, values)
+        self.dense.ravel ()[cells] = values
+
+        self.check ()
+        self.assertEqual (self.matrix.get_flat (cells).tolist (), values.tolist ())
+
+    def test_set_flat_repeated_cells (self):
+
+        self.matrix.set_flat ([5, 30, 5, 30, 5], [1, 2, 3, 0, 4])
+        self.dense.ravel ()[5] = 4
+
+        self.check ()
+
+    def test_dense_set_flat_repeated_cells (self):
+
+        # Big batches take the dense copy path
+        matrix = ChunkedMatrix (100, 100, 16)
+        cells = numpy.concatenate ((numpy.arange (5000), [10, 20]))
+        values = numpy.ones (len(cells), dtype=numpy.uint16)
+        values[-2:] = (7, 8)
+        matrix.set_flat (cells, values)
+
+        self.assertEqual (matrix.get_flat ([10, 20, 30, 9999]).tolist (), [7, 8, 1, 0])
+
+    def test_clear (self):
+
+        self.matrix.write (0, 0, numpy.ones ((10, 7)))
+        self.matrix.clear ()
+        self.check ()
+
+if '__main__' == __name__:
+
+    unittest.main ()
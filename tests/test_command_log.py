@@ -0,0 +1,115 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import unittest
+
+from pystitchy.command_log import Command, CommandLog, Stroke
+
+def command (cell, old = 0, new = 1):
+
+    return Command ([cell], [old], [new])
+
+class CommandLogTest (unittest.TestCase):
+
+    def test_wraps_around_at_capacity (self):
+
+        log = CommandLog (3)
+        commands = [command (i) for i in range (5)]
+        for c in commands:
+            log.push (c)
+
+        self.assertEqual (log.get_history (), (commands[2:], 3))
+        self.assertTrue (log.undo () is commands[4])
+        self.assertTrue (log.undo () is commands[3])
+        self.assertTrue (log.undo () is commands[2])
+        self.assertEqual (log.undo (), None)
+        self.assertTrue (log.redo () is commands[2])
+
+    def test_drops_oldest_over_max_entries (self):
+
+        log = CommandLog (10, 3)
+        big = Command ([0, 1, 2], [0, 0, 0], [1, 1, 1])
+        small = command (3)
+        log.push (big)
+        log.push (small)
+
+        self.assertEqual (log.get_history (), ([small], 1))
+
+    def test_new_command_discards_redo (self):
+
+        log = CommandLog (3)
+        commands = [command (i) for i in range (4)]
+        for c in commands[:3]:
+            log.push (c)
+        log.undo ()
+        log.undo ()
+        log.push (commands[3])
+
+        self.assertEqual (log.redo (), None)
+        self.assertEqual (log.get_history (), ([commands[0], commands[3]], 2))
+        self.assertTrue (log.undo () is commands[3])
+        self.assertTrue (log.undo () is commands[0])
+        self.assertEqual (log.undo (), None)
+
+    def test_discards_redo_after_wrapping (self):
+
+        log = CommandLog (3)
+        commands = [command (i) for i in range (5)]
+        for c in commands[:4]:
+            log.push (c)
+        log.undo ()
+        log.push (commands[4])
+
+        self.assertEqual (log.get_history (), ([commands[1], commands[2], commands[4]], 3))
+        self.assertEqual (log.redo (), None)
+
+    def test_set_history_drops_what_does_not_fit (self):
+
+        log = CommandLog (2)
+        commands = [command (i) for i in range (4)]
+        log.set_history (commands, 3)
+
+        self.assertEqual (log.get_history (), (commands[2:], 1))
+
+class StrokeTest (unittest.TestCase):
+
+    def test_merges_into_one_command (self):
+
+        stroke = Stroke ()
+        stroke.add_cells ([5, 7], [0, 2], [1, 1])
+        stroke.add_cells ([5, 9], [1, 3], [4, 1])
+        # Back to its color before the stroke
+        stroke.add_cells ([7], [1], [2])
+
+        c = stroke.get_command ()
+        self.assertEqual (c.cells.tolist (), [5, 9])
+        self.assertEqual (c.old.tolist (), [0, 3])
+        self.assertEqual (c.new.tolist (), [4, 1])
+
+    def test_no_changes (self):
+
+        stroke = Stroke ()
+        stroke.add_cells ([3, 3], [2, 1], [1, 2])
+        self.assertEqual (stroke.get_command (), None)
+
+if '__main__' == __name__:
+
+    unittest.main ()
@@ -0,0 +1,70 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import unittest
+
+import numpy
+
+from pystitchy.grid_shapes import grid_lines, cell_rects
+
+class GridShapesTest (unittest.TestCase):
+
+    def setUp (self):
+
+        self.xs = numpy.arange (26) * 10 + 50
+        self.ys = numpy.arange (16) * 10 + 50
+
+    def test_lines (self):
+
+        lines, bold = grid_lines (self.xs, self.ys, 0, 0, 25, 15)
+        self.assertEqual (len(lines), 26 + 16)
+        self.assertEqual (lines[0].tolist (), [50, 50, 50, 200])
+        self.assertEqual (lines[26].tolist (), [50, 50, 300, 50])
+
+        # Every 10 cells, counting from the first one
+        self.assertEqual (sorted (bold[:3,0].tolist ()), [50, 150, 250])
+        self.assertEqual (sorted (bold[3:,1].tolist ()), [50, 150])
+
+    def test_lines_of_range (self):
+
+        lines, bold = grid_lines (self.xs, self.ys, 8, 3, 12, 5)
+        self.assertEqual (len(lines), 5 + 3)
+        self.assertEqual (bold.tolist (), [[150, 80, 150, 100]])
+
+    def test_rects (self):
+
+        cells = numpy.zeros ((4, 3), dtype=numpy.uint16)
+        cells[1, 2] = 2
+        cells[3, 0] = 1
+        cells[0, 0] = 2
+        groups = cell_rects (cells, self.xs, self.ys, 2, 1, 10)
+
+        self.assertEqual ([index for index, rects in groups], [1, 2])
+        self.assertEqual (groups[0][1].tolist (), [[101, 61, 9, 9]])
+        self.assertEqual (sorted (groups[1][1].tolist ()), [[71, 61, 9, 9], [81, 81, 9, 9]])
+
+    def test_no_rects (self):
+
+        self.assertEqual (cell_rects (numpy.zeros ((3, 3), dtype=numpy.uint16), self.xs, self.ys, 0, 0, 10), [])
+
+if '__main__' == __name__:
+
+    unittest.main ()
@@ -0,0 +1,91 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import random
+import unittest
+import numpy
+
+from pystitchy.pattern import Pattern
+
+class PatternCountsTest (unittest.TestCase):
+
+    def setUp (self):
+
+        self.pattern = Pattern (30, 20)
+        self.colors = [(i, i, i) for i in range (40)]
+
+    def check (self):
+
+        plane = self.pattern.get_plane ()
+        counts = numpy.bincount (plane.ravel ())
+        ncolors = len(self.pattern.get_color_table ())
+
+        for index in range (ncolors + 1):
+            expected = counts[index] if index < len(counts) else 0
+            self.assertEqual (self.pattern.get_count (index), expected)
+
+        # Most used first, ties in color table order
+        usage = [(self.pattern.get_color (i), counts[i]) for i in range (1, len(counts)) if counts[i]]
+        usage.sort (key=lambda use: -use[1])
+        self.assertEqual (self.pattern.get_usage (), usage)
+
+    def test_new_pattern (self):
+
+        self.assertEqual (self.pattern.get_count (0), 600)
+        self.assertEqual (self.pattern.get_usage (), [])
+
+    def test_same_color_again (self):
+
+        index = self.pattern.get_color_index (self.colors[1])
+        cells = numpy.arange (10, 50)
+        self.pattern.set_cells (cells, index)
+        self.pattern.set_cells (cells[:20], index)
+        self.pattern.set_cell (0, 10, self.colors[1])
+        self.check ()
+        self.assertEqual (self.pattern.get_count (index), 40)
+
+    def test_mixed_changes (self):
+
+        rng = random.Random (3)
+        indices = self.pattern.get_color_indices (self.colors[:5])
+
+        for step in range (200):
+            choice = rng.randrange (10)
+            if choice == 0:
+                plane = numpy.array ([[rng.choice ([0] + indices) for y in range (20)] for x in range (30)],
+                                     dtype=numpy.uint16)
+                self.pattern.set_plane (plane)
+            elif choice < 4:
+                rgb = rng.choice ([None] + self.colors[:5])
+                self.pattern.set_cell (rng.randrange (30), rng.randrange (20), rgb)
+            else:
+                cells = numpy.array (rng.sample (range (600), rng.randint (1, 100)))
+                # Colors that grow the color table too
+                index = self.pattern.get_color_index (rng.choice (self.colors))
+                values = numpy.array ([rng.choice ([0, index] + indices) for cell in cells],
+                                      dtype=numpy.uint16)
+                self.pattern.set_cells (cells, values)
+
+            self.check ()
+
+if '__main__' == __name__:
+
+    unittest.main ()
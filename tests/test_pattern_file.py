@@ -0,0 +1,168 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy
+
+from pystitchy.command_log import Command
+from pystitchy.pattern_file import save_pattern, load_pattern, HEADER
+
+COLORS = [('310', (0, 0, 0)), ('321', (199, 43, 59)), ('B5200', (255, 255, 255)), ('3865', (249, 247, 241))]
+
+class PatternFileTest (unittest.TestCase):
+
+    def setUp (self):
+
+        self.directory = tempfile.mkdtemp ()
+        self.path = os.path.join (self.directory, 'test.stitchy')
+
+        # Color 3 is not used, and color 4 only in the history
+        self.plane = numpy.zeros ((30, 20), dtype=numpy.uint16)
+        self.plane[5:25, 2:8] = 1
+        self.plane[10:12, 10:18] = 2
+        self.plane[3, 3] = 2
+        self.history = ([Command ([0, 1, 2], [0, 0, 0], [4, 4, 4]),
+                         Command ([0, 1, 2], [4, 4, 4], [0, 0, 0]),
+                         Command ([65, 66], [1, 1], [2, 2])], 2)
+
+    def tearDown (self):
+
+        shutil.rmtree (self.directory)
+
+    def check_roundtrip (self, compress, history):
+
+        save_pattern (self.path, self.plane, COLORS, history, compress)
+        plane, colors, loaded = load_pattern (self.path)
+
+        # Colors are renumbered without the unused ones
+        if history is None:
+            self.assertEqual (colors, COLORS[:2])
+        else:
+            self.assertEqual (colors, [COLORS[0], COLORS[1], COLORS[3]])
+        table = numpy.array ([0, 1, 2, 0, 3])
+        self.assertEqual (plane.shape, self.plane.shape)
+        self.assertTrue ((plane == table[self.plane]).all ())
+
+        if history is None:
+            self.assertTrue (loaded is None)
+            return
+
+        commands, position = loaded
+        self.assertEqual (position, history[1])
+        self.assertEqual (len(commands), len(history[0]))
+        for command, saved in zip (commands, history[0]):
+            self.assertTrue ((command.cells == saved.cells).all ())
+            self.assertTrue ((command.old == table[saved.old]).all ())
+            self.assertTrue ((command.new == table[saved.new]).all ())
+
+    def test_roundtrip (self):
+
+        for compress in (None, True, False):
+            for history in (None, self.history):
+                self.check_roundtrip (compress, history)
+
+    def test_compress_when_smaller (self):
+
+        save_pattern (self.path, self.plane, COLORS, compress=False)
+        raw = os.path.getsize (self.path)
+        save_pattern (self.path, self.plane, COLORS)
+        self.assertTrue (os.path.getsize (self.path) < raw)
+
+    def test_empty_history (self):
+
+        save_pattern (self.path, self.plane, COLORS, ([], 0))
+        plane, colors, history = load_pattern (self.path)
+        self.assertEqual (history, ([], 0))
+
+    def test_not_a_pattern (self):
+
+        f = open(self.path, 'wb')
+        f.write ('STITCHY-TEXT 1\n3 2 1\n')
+        f.close()
+        self.assertRaises (ValueError, load_pattern, self.path)
+
+    def test_truncated (self):
+
+        for compress in (True, False):
+            save_pattern (self.path, self.plane, COLORS, self.history, compress)
+            data = open(self.path, 'rb').read ()
+            for size in (10, 100, len(data) // 2, len(data) - 1):
+                f = open(self.path, 'wb')
+                f.write (data[:size])
+                f.close()
+                self.assertRaises (ValueError, load_pattern, self.path)
+
+    def test_corrupt_runs (self):
+
+        save_pattern (self.path, self.plane, COLORS, compress=True)
+        plane, colors, history = load_pattern (self.path)
+
+        # Runs adding up to more cells than the plane has
+        data = bytearray (open(self.path, 'rb').read ())
+        data[-4:] = b'\xff\xff\x00\x00'
+        f = open(self.path, 'wb')
+        f.write (data)
+        f.close()
+        self.assertRaises (ValueError, load_pattern, self.path)
+
+    def corrupt (self, fmt, value, section, offset):
+
+        # Writes a value into the plane (section 0) or the history
+        # (section 1) of the saved file, at an offset into the section
+        data = bytearray (open(self.path, 'rb').read ())
+        header = HEADER.unpack_from (bytes (data))
+        struct.pack_into (fmt, data, header[6 + 2*section] + offset, value)
+        f = open(self.path, 'wb')
+        f.write (data)
+        f.close()
+
+    def test_bad_color_in_plane (self):
+
+        for compress, offset in ((False, 0), (True, 8)):
+            save_pattern (self.path, self.plane, COLORS, compress=compress)
+            self.corrupt ('<H', 99, 0, offset)
+            self.assertRaises (ValueError, load_pattern, self.path)
+
+    def test_bad_cell_in_history (self):
+
+        # Cells of the first command come after the command count, the
+        # position and the number of cells
+        for cell in (1000000, 30 * 20, -1):
+            save_pattern (self.path, self.plane, COLORS, self.history)
+            self.corrupt ('<i', cell, 1, 12)
+            self.assertRaises (ValueError, load_pattern, self.path)
+
+    def test_bad_color_in_history (self):
+
+        # Old and then new colors of the first command, of 3 cells
+        for offset in (12 + 4*3, 12 + 4*3 + 2*3):
+            save_pattern (self.path, self.plane, COLORS, self.history)
+            self.corrupt ('<H', 99, 1, offset)
+            self.assertRaises (ValueError, load_pattern, self.path)
+
+if '__main__' == __name__:
+
+    unittest.main ()
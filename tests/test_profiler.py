@@ -0,0 +1,54 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import threading
+import unittest
+
+from pystitchy.profiler import Profiler
+
+class ProfilerTest (unittest.TestCase):
+
+    def test_threads (self):
+
+        profiler = Profiler ()
+        profiler.enable ()
+
+        def work ():
+            for i in range (2000):
+                profiler.add ('op', 0.001)
+                profiler.count ('calls')
+                if not i % 100:
+                    profiler.get_stats ()
+
+        threads = [threading.Thread (target=work) for i in range (4)]
+        for thread in threads:
+            thread.start ()
+        for thread in threads:
+            thread.join ()
+
+        stats = profiler.get_stats ()
+        self.assertEqual (stats['timings']['op']['count'], 8000)
+        self.assertAlmostEqual (stats['timings']['op']['total'], 8.0)
+        self.assertEqual (stats['counters']['calls'], 8000)
+
+if '__main__' == __name__:
+
+    unittest.main ()
@@ -0,0 +1,118 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import base64
+import multiprocessing
+import time
+import unittest
+
+from pystitchy import service
+from pystitchy.service import ConversionService, QueueFull, ResultCache
+
+COLORS = {'310': ('#000000', 'Black'), 'Blanc': ('#eeeeee', 'White')}
+
+def slow_job (job):
+
+    # Stands in for convert_job, in the worker processes
+    time.sleep (1)
+    return ('{}', 1.0, None)
+
+class ResultCacheTest (unittest.TestCase):
+
+    def test_evicts_least_recently_used (self):
+
+        cache = ResultCache (10)
+        cache.put ('a', 'xxxx')
+        cache.put ('b', 'xxxx')
+        cache.get ('a')
+        cache.put ('c', 'xxxx')
+
+        self.assertEqual (cache.get ('b'), None)
+        self.assertEqual (cache.get ('a'), 'xxxx')
+        self.assertEqual (cache.get_stats ()['bytes'], 8)
+
+    def test_skips_results_bigger_than_the_cache (self):
+
+        cache = ResultCache (3)
+        cache.put ('a', 'xxxx')
+        self.assertEqual (cache.get ('a'), None)
+
+class ParseRequestTest (unittest.TestCase):
+
+    def setUp (self):
+
+        self.service = ConversionService (COLORS, 1)
+        self.image = base64.b64encode ('image')
+
+    def tearDown (self):
+
+        self.service.close ()
+
+    def test_same_settings_same_key (self):
+
+        key1, job = self.service.parse_request ({'image': self.image, 'palette': ['Blanc', '310']})
+        key2, job = self.service.parse_request ({'image': self.image, 'palette': ['310', 'Blanc']})
+        key3, job = self.service.parse_request ({'image': self.image, 'width': 60})
+        self.assertEqual (key1, key2)
+        self.assertNotEqual (key1, key3)
+
+    def test_rejects_bools (self):
+
+        for name in ('width', 'height', 'num_colors', 'remove_confetti'):
+            self.assertRaises (ValueError, self.service.parse_request, {'image': self.image, name: True})
+
+    def test_rejects_unknown_colors (self):
+
+        self.assertRaises (ValueError, self.service.parse_request, {'image': self.image, 'palette': ['1']})
+
+class QueueTest (unittest.TestCase):
+
+    def setUp (self):
+
+        self.convert_job = service.convert_job
+        service.convert_job = slow_job
+        self.service = ConversionService (COLORS, 1, max_queue=1, timeout=0.2)
+
+    def tearDown (self):
+
+        self.service.close ()
+        service.convert_job = self.convert_job
+
+    def test_timed_out_job_keeps_its_place (self):
+
+        self.assertRaises (multiprocessing.TimeoutError, self.service.convert, 'a', None)
+        self.assertEqual (self.service.get_metrics ()['queue_depth'], 1)
+        self.assertEqual (self.service.get_metrics ()['timed_out'], 1)
+        self.assertRaises (QueueFull, self.service.convert, 'b', None)
+
+        # Until the worker finishes the job
+        for i in range (50):
+            metrics = self.service.get_metrics ()
+            if not metrics['queue_depth']:
+                break
+            time.sleep (0.1)
+        self.assertEqual (metrics['queue_depth'], 0)
+        self.assertEqual (metrics['converted'], 1)
+        self.assertEqual (self.service.convert ('a', None), ('{}', True))
+
+if '__main__' == __name__:
+
+    unittest.main ()
@@ -0,0 +1,211 @@
+# Copyright (c) 2012 Israel Herraiz <isra@herraiz.org>
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import unittest
+
+import numpy
+
+from pystitchy.tools import line_cells, path_cells, flood_fill, label_components, rectangle_mask, remove_confetti
+
+def cells (xs, ys):
+
+    return zip (xs.tolist (), ys.tolist ())
+
+class LineCellsTest (unittest.TestCase):
+
+    def test_shallow (self):
+
+        self.assertEqual (cells (*line_cells (0, 0, 5, 2)), [(0, 0), (1, 0), (2, 1), (3, 1), (4, 2), (5, 2)])
+
+    def test_steep (self):
+
+        self.assertEqual (cells (*line_cells (0, 0, 2, 5)), [(0, 0), (0, 1), (1, 2), (1, 3), (2, 4), (2, 5)])
+
+    def test_reverse (self):
+
+        self.assertEqual (cells (*line_cells (2, 5, 0, 0)), [(2, 5), (2, 4), (1, 3), (1, 2), (0, 1), (0, 0)])
+        self.assertEqual (cells (*line_cells (3, 1, -3, 1)), [(x, 1) for x in range (3, -4, -1)])
+
+    def test_single_point (self):
+
+        self.assertEqual (cells (*line_cells (3, 4, 3, 4)), [(3, 4)])
+        self.assertEqual (cells (*path_cells ([(3, 4)])), [(3, 4)])
+
+    def test_connected (self):
+
+        # Every step moves one cell, also diagonally, from end to end
+        for x1, y1 in ((7, 3), (-7, 3), (3, -7), (-3, -7), (5, 5), (-5, 5), (0, 9), (9, 0)):
+            line = cells (*line_cells (0, 0, x1, y1))
+            self.assertEqual (line[0], (0, 0))
+            self.assertEqual (line[-1], (x1, y1))
+            self.assertEqual (len(line), max (abs(x1), abs(y1)) + 1)
+            for (ax, ay), (bx, by) in zip (line[:-1], line[1:]):
+                self.assertEqual (max (abs(bx - ax), abs(by - ay)), 1)
+
+    def test_path (self):
+
+        points = [(0, 0), (3, 0), (3, -2), (1, 2)]
+        expected = []
+        for (x0, y0), (x1, y1) in zip (points[:-1], points[1:]):
+            expected.extend (cells (*line_cells (x0, y0, x1, y1)))
+
+        self.assertEqual (cells (*path_cells (points)), expected)
+        self.assertEqual (expected[:6], [(0, 0), (1, 0), (2, 0), (3, 0), (3, 0), (3, -1)])
+
+class RectangleMaskTest (unittest.TestCase):
+
+    def test_inside (self):
+
+        mask = rectangle_mask ((10, 10), 2, 3, 4, 6)
+        self.assertEqual (mask.sum (), 3 * 4)
+        self.assertTrue (mask[2:5, 3:7].all ())
+
+    def test_reversed_corners (self):
+
+        self.assertTrue ((rectangle_mask ((10, 10), 4, 6, 2, 3) == rectangle_mask ((10, 10), 2, 3, 4, 6)).all ())
+
+    def test_partly_outside (self):
+
+        mask = rectangle_mask ((10, 10), -3, 8, 1, 14)
+        self.assertEqual (mask.sum (), 2 * 2)
+        self.assertTrue (mask[0:2, 8:10].all ())
+
+    def test_fully_outside (self):
+
+        for corners in ((-4, 2, -2, 5), (2, -4, 5, -2), (12, 2, 15, 5), (2, 10, 5, 12), (-2, -2, -5, -5)):
+            self.assertFalse (rectangle_mask ((10, 10), *corners).any (), corners)
+
+class LabelComponentsTest (unittest.TestCase):
+
+    def test_same_as_flood_fill (self):
+
+        random = numpy.random.RandomState (0)
+        for colors in (2, 3, 8):
+            plane = random.randint (0, colors, (60, 40))
+            labels = label_components (plane)
+            for x, y in random.randint (0, 40, (20, 2)):
+                region = flood_fill (plane, x, y, max_spans = plane.size)
+                self.assertTrue ((region == (labels == labels[x, y])).all (), (colors, x, y))
+
+    def test_diagonals_not_joined (self):
+
+        labels = label_components (numpy.array ([[1, 0], [0, 1]]))
+        self.assertEqual (len(numpy.unique (labels)), 4)
+
+    def test_dot_lattice (self):
+
+        # Every dot is a region of its own, and the background around
+        # them a single one
+        plane = numpy.zeros ((101, 81), dtype=numpy.uint8)
+        plane[::2, ::2] = 1
+        labels = label_components (plane)
+        dots = labels[plane == 1]
+        self.assertEqual (len(numpy.unique (dots)), 51 * 41)
+        self.assertEqual (len(numpy.unique (labels[plane == 0])), 1)
+        self.assertFalse (numpy.in1d (labels[plane == 0], dots).any ())
+
+    def test_checkerboard (self):
+
+        plane = numpy.indices ((64, 48)).sum (axis=0) % 2
+        self.assertEqual (len(numpy.unique (label_components (plane))), 64 * 48)
+
+    def test_comb (self):
+
+        # Teeth along y, joined only by the first line, which links every
+        # tooth to the same run
+        plane = numpy.zeros ((60, 40), dtype=numpy.uint8)
+        plane[0] = 1
+        plane[:, ::2] = 1
+        labels = label_components (plane)
+        self.assertEqual (len(numpy.unique (labels[plane == 1])), 1)
+        self.assertEqual (len(numpy.unique (labels[plane == 0])), 20)
+
+class RemoveConfettiTest (unittest.TestCase):
+
+    def sizes (self, plane):
+
+        labels = label_components (plane)
+        return numpy.bincount (labels.ravel ())[labels]
+
+    def test_isolated_stitch (self):
+
+        plane = numpy.zeros ((5, 5), dtype=numpy.uint16) + 3
+        plane[2, 2] = 7
+        self.assertTrue ((remove_confetti (plane, 2) == 3).all ())
+
+    def test_dominant_color (self):
+
+        plane = numpy.array ([[1, 1, 1, 2, 2],
+                              [1, 1, 1, 2, 2],
+                              [1, 5, 5, 2, 2],
+                              [1, 1, 1, 2, 2]], dtype=numpy.uint16)
+        result = remove_confetti (plane, 3)
+        self.assertTrue ((result[2, 1:3] == 1).all ())
+        self.assertEqual ((result != plane).sum (), 2)
+
+    def test_big_regions_untouched (self):
+
+        random = numpy.random.RandomState (1)
+        for min_size in (2, 3, 5):
+            plane = random.randint (1, 5, (50, 30)).astype (numpy.uint16)
+            big = self.sizes (plane) >= min_size
+            result = remove_confetti (plane, min_size)
+            self.assertTrue ((result[big] == plane[big]).all (), min_size)
+            self.assertTrue ((self.sizes (result) >= min_size).all (), min_size)
+
+    def test_empty_cells (self):
+
+        # An image imported into part of the pattern, with a stitch
+        # placed by hand in the empty part
+        random = numpy.random.RandomState (3)
+        plane = numpy.zeros ((120, 80), dtype=numpy.uint16)
+        plane[10:70, 5:50] = numpy.repeat (random.randint (1, 6, (20, 15)), 3, axis=0).repeat (3, axis=1)
+        noise = random.rand (60, 45) < 0.2
+        plane[10:70, 5:50][noise] = random.randint (1, 6, noise.sum ())
+        plane[100, 70] = 3
+
+        result = remove_confetti (plane, 3)
+        self.assertTrue (((result == 0) == (plane == 0)).all ())
+        self.assertEqual (result[100, 70], 3)
+        sizes = self.sizes (result)
+        self.assertTrue ((sizes[10:70, 5:50] >= 3).all ())
+
+    def test_original_not_changed (self):
+
+        plane = numpy.array ([[0, 0, 0], [0, 1, 0], [0, 0, 0]], dtype=numpy.uint16)
+        remove_confetti (plane, 2)
+        self.assertEqual (plane[1, 1], 1)
+
+    def test_random_colors (self):
+
+        # The worst case, almost every stitch being confetti. Every cell
+        # ends up in a big enough region, of one of the colors around it.
+        plane = numpy.random.RandomState (2).randint (1, 21, (200, 150)).astype (numpy.uint16)
+        big = self.sizes (plane) >= 3
+        result = remove_confetti (plane, 3)
+
+        self.assertTrue ((self.sizes (result) >= 3).all ())
+        self.assertTrue ((result[big] == plane[big]).all ())
+        self.assertTrue (numpy.in1d (result, numpy.unique (plane[big])).all ())
+
+if '__main__' == __name__:
+
+    unittest.main ()